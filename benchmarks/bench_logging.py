@@ -0,0 +1,100 @@
+"""
+Per-call cost, on the request thread, of the debug output of the question pipeline.
+
+    python -m benchmarks.bench_logging
+    python -m benchmarks.bench_logging --calls 2000 --rows 500 --json logging.json
+
+Payloads like the ones the pipeline used to print on every question (the entities dict, a DataFrame of matched
+labels) are written in four ways:
+    print          print() to a sink, as the old code did
+    debug-off      log.debug at the production level (INFO): the record is dropped before any formatting
+    debug-queue    log.debug with the level enabled: the caller renders the message and enqueues, the listener
+                   encodes and writes
+    debug-sync     log.debug through a plain StreamHandler, formatting and writing on the caller thread
+The sink is os.devnull by default, so the figures are a lower bound of what a terminal or a pipe costs.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks.load_test import percentile
+from src.bot.log import StructuredFormatter, get_logger, setup_logging, stop_logging
+
+log = get_logger('bench')
+
+
+def make_payloads(rows: int) -> dict:
+    entities = {f'Entity {i}': [f'Q{1000 + i}', f'Q{2000 + i}'] for i in range(20)}
+    frame = pd.DataFrame({'label': [f'Some film title {i}' for i in range(rows)],
+                          'id': [f'Q{i}' for i in range(rows)],
+                          'score': [100 - i % 40 for i in range(rows)]})
+    return {'dict': entities, 'dataframe': frame}
+
+
+def _time_calls(call, payload, calls: int) -> list:
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        call(payload)
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)
+
+
+def measure(mode: str, payload, calls: int, sink) -> list:
+    if mode == 'print':
+        with contextlib.redirect_stdout(sink):
+            return _time_calls(print, payload, calls)
+
+    if mode == 'debug-sync':
+        logger = logging.getLogger('bot')
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(StructuredFormatter())
+        old_handlers, logger.handlers = logger.handlers, [handler]
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        try:
+            return _time_calls(lambda value: log.debug('Payload: %s', value), payload, calls)
+        finally:
+            logger.handlers = old_handlers
+
+    setup_logging('INFO' if mode == 'debug-off' else 'DEBUG', stream=sink)
+    try:
+        return _time_calls(lambda value: log.debug('Payload: %s', value), payload, calls)
+    finally:
+        stop_logging()  # waits until the queue is drained
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare print() with the queue logger on pipeline-like payloads.')
+    parser.add_argument('--calls', type=int, default=1000)
+    parser.add_argument('--rows', type=int, default=200, help='rows of the DataFrame payload')
+    parser.add_argument('--sink', default=os.devnull, help='file the output goes to')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    report = {}
+    with open(args.sink, 'w') as sink:
+        for payload_name, payload in make_payloads(args.rows).items():
+            for mode in ('print', 'debug-off', 'debug-queue', 'debug-sync'):
+                timings = measure(mode, payload, args.calls, sink)
+                report.setdefault(payload_name, {})[mode] = {
+                    'mean_us': round(sum(timings) / len(timings) * 1e6, 2),
+                    'p50_us': round(percentile(timings, 50) * 1e6, 2),
+                    'p99_us': round(percentile(timings, 99) * 1e6, 2),
+                }
+
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
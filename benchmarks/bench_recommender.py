@@ -0,0 +1,113 @@
+"""
+Compare the recommendation backends on load time, per-request latency and resident memory.
+
+    python -m benchmarks.bench_recommender                               # every backend whose data files exist
+    python -m benchmarks.bench_recommender --backend embeddings parquet --requests 500
+
+Every backend is measured in its own subprocess, so the memory figures don't include the other backends. The caches
+of RecommendationSolver are disabled, every request goes through the similarity backend.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from benchmarks.load_test import percentile
+from embeddings.embedding_utils import ENTITY_EMBEDS_PATH
+from recommender.recommender_utils import SIMILARITY_PATH, SPARSE_SIMILARITY_PATH, MMAP_SIMILARITY_PATH
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# backend name -> (RecommendationSolver backend, similarity_path)
+BACKENDS = {
+    'embeddings': ('embeddings', None),
+    'sparse': ('matrix', SPARSE_SIMILARITY_PATH),
+    'mmap': ('matrix', MMAP_SIMILARITY_PATH),
+    'parquet': ('matrix', SIMILARITY_PATH),
+}
+DATA_FILES = {'embeddings': ENTITY_EMBEDS_PATH, 'sparse': SPARSE_SIMILARITY_PATH, 'mmap': MMAP_SIMILARITY_PATH,
+              'parquet': SIMILARITY_PATH}
+
+
+def _rss_mb() -> float:
+    if psutil is None:
+        return float('nan')
+    return psutil.Process().memory_info().rss / 1e6
+
+
+def measure(name: str, n_requests: int, max_seeds: int, seed: int) -> dict:
+    """ Load one backend in the current process and time n_requests random recommendations. """
+    from recommender.recommender import RecommendationSolver
+
+    backend, similarity_path = BACKENDS[name]
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    solver = RecommendationSolver(similarity_path, cache_path=None, lru_size=0, backend=backend)
+    load_s = time.perf_counter() - start
+    rss_loaded = _rss_mb()
+
+    rng = random.Random(seed)
+    films = sorted(str(qid) for qid in solver.similarity.row_index)
+    latencies = []
+    for _ in range(n_requests):
+        seeds = rng.sample(films, rng.randint(1, max_seeds))
+        entities = {'http://www.wikidata.org/entity/' + qid: None for qid in seeds}
+        start = time.perf_counter()
+        solver.process_recommendation_direct(entities)
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    return {
+        'backend': name,
+        'films': len(films),
+        'load_s': round(load_s, 3),
+        'latency_ms': {label: round(percentile(latencies, p) * 1000, 3)
+                       for label, p in (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100))},
+        'rss_loaded_mb': round(rss_loaded - rss_before, 1),
+        'rss_after_mb': round(_rss_mb(), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the recommendation backends.')
+    parser.add_argument('--backend', nargs='+', choices=list(BACKENDS),
+                        help='defaults to every backend whose data file exists')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--max-seeds', type=int, default=3, help='films per request, drawn from 1..max-seeds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write the report to this file')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.requests, args.max_seeds, args.seed)))
+        return
+
+    if psutil is None:
+        print("psutil is not installed, memory usage is not reported.", file=sys.stderr)
+    names = args.backend or [name for name, path in DATA_FILES.items() if os.path.exists(path)]
+    report = []
+    for name in names:
+        child = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_recommender', '--child', name, '--requests', str(args.requests),
+             '--max-seeds', str(args.max_seeds), '--seed', str(args.seed)],
+            stdout=subprocess.PIPE, text=True)
+        if child.returncode != 0:
+            print(f"Backend {name} failed (exit code {child.returncode}).", file=sys.stderr)
+            continue
+        report.append(json.loads(child.stdout.strip().splitlines()[-1]))
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,471 @@
+"""
+Self-contained fixtures of the bot's datasets, for offline benchmarks.
+
+    python -m benchmarks.fixtures /tmp/bot_fixture                       # the films of the benchmark questions
+    python -m benchmarks.fixtures /tmp/bot_100k --entities 100000        # scaled synthetic data
+
+Writes a `dataset/` tree with the same layout, file formats and ID conventions as the real one (N-Triples graph,
+films / humans / entities / relations CSVs, film_double.csv, TransE-style embeddings with their .del files, film x
+film similarity matrix, aggregated crowd data), covering the films and people of the benchmark questions
+(benchmarks/replay.py). Every path of the bot is relative to the working directory, so running from the fixture
+root makes the unmodified components load it.
+
+With --entities the curated films are extended with generated films, people and other entities in the proportions
+of the real data, from 1k up to 1M entities (at 1M and 256 dimensions the embeddings alone take 1 GB).
+"""
+import argparse
+import itertools
+import os
+import time
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from crowdsourcing.crowdsourcing_utils import CROWD_AGGREGATED_PATH, AGGREGATED_COLUMNS, ANSWER_IDS, \
+    kappa_statistics, fleiss_kappa
+from embeddings.embedding_utils import ENTITY_EMBEDS_PATH, RELATION_EMBEDS_PATH, ENTITY_IDS_PATH, RELATION_IDS_PATH
+from recommender.recommender_utils import FILM_PATH, SIMILARITY_PATH, SPARSE_SIMILARITY_PATH, MMAP_SIMILARITY_PATH, \
+    qids_path
+from src.bot.graph_tables import GRAPH_PATH, WD, RDFS_LABEL, SCHEMA_DESCRIPTION
+
+WDT = 'http://www.wikidata.org/prop/direct/'
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+FILM_DOUBLE_PATH = 'dataset/film_double.csv'
+HUMANS_PATH = 'dataset/humans_clean.csv'
+ENTITIES_PATH = 'dataset/entities_clean.csv'
+RELATIONS_PATH = 'dataset/relations.csv'
+EMBEDDING_DIM = 256  # same as the ddis-graph-embeddings
+FIRST_QID = 900000  # fixture QIDs are Q900000, Q900001, ...
+TOP_K = 100  # neighbours per film of the sparse similarity store
+DENSE_MAX_FILMS = 10000  # the dense similarity formats (.parquet, float32 .npy) are written up to this many films
+
+# Shares of the real data: 158'901 entities in the embeddings, 27'468 films, 12% of them share their label
+FILM_SHARE = 0.17
+HUMAN_SHARE = 0.45
+DUPLICATE_SHARE = 0.06  # generated films that take the label of another film
+CROWD_SHARE = 0.01  # generated films with a crowd answer
+N_RELATIONS = 248  # relations of the real embeddings
+EXTRA_TRIPLES = 8  # statements per generated entity on the generated relations, ~13 triples per entity in total
+
+ADJECTIVES = ['Silent', 'Broken', 'Golden', 'Last', 'Hidden', 'Crimson', 'Endless', 'Frozen', 'Lost', 'Wild',
+              'Distant', 'Burning', 'Quiet', 'Electric', 'Hollow', 'Midnight', 'Savage', 'Velvet', 'Iron', 'Secret',
+              'Bitter', 'Shining', 'Forgotten', 'Restless', 'Northern', 'Little', 'Dark', 'Eternal', 'Scarlet',
+              'Lonely']
+NOUNS = ['River', 'Kingdom', 'Garden', 'Horizon', 'Empire', 'Harbor', 'Mirror', 'Voyage', 'Desert', 'Circus',
+         'Orchard', 'Lighthouse', 'Carnival', 'Frontier', 'Symphony', 'Monsoon', 'Labyrinth', 'Station', 'Island',
+         'Citadel', 'Prophecy', 'Avalanche', 'Meadow', 'Cathedral', 'Tide', 'Compass', 'Lantern', 'Serpent', 'Canyon',
+         'Winter']
+FIRST_NAMES = ['Anna', 'Marco', 'Julia', 'Peter', 'Sofia', 'David', 'Elena', 'Thomas', 'Laura', 'Michael', 'Clara',
+               'Daniel', 'Nina', 'Lucas', 'Emma', 'Victor', 'Alice', 'Hugo', 'Maria', 'Oscar', 'Irene', 'Paul',
+               'Greta', 'Simon', 'Vera', 'Adrian', 'Lena', 'Felix', 'Rosa', 'Jonas']
+LAST_NAMES = ['Keller', 'Moreau', 'Lindqvist', 'Romano', 'Novak', 'Hartmann', 'Castillo', 'Brennan', 'Okafor',
+              'Tanaka', 'Weber', 'Silva', 'Jansen', 'Kowalski', 'Dubois', 'Rossi', 'Andersen', 'Petrov', 'Fischer',
+              'Morales', 'Costa', 'Lambert', 'Sato', 'Byrne', 'Vogel', 'Marchetti', 'Horvat', 'Nilsson', 'Bauer',
+              'Quinn']
+GENRES = ['drama film', 'comedy film', 'thriller film', 'horror film', 'documentary film', 'romance film',
+          'western film', 'musical film', 'crime film', 'war film', 'animated film', 'action film',
+          'science fiction film', 'fantasy film', 'adventure film', 'biographical film', 'mystery film', 'noir film']
+RATINGS = ['G', 'PG', 'PG-13', 'R', 'NC-17']
+OCCUPATIONS = ['film actor', 'film actress', 'film director', 'screenwriter', 'film producer', 'cinematographer']
+
+# Relations of the fixture graph, as in relations.csv: PID (or full IRI) -> label
+RELATIONS = {
+    'P161': 'cast member', 'P57': 'director', 'P58': 'screenwriter', 'P577': 'publication date', 'P136': 'genre',
+    'P1657': 'MPAA film rating', 'P2142': 'box office', 'P1431': 'executive producer', 'P18': 'image',
+    'P31': 'instance of', 'P279': 'subclass of', SCHEMA_DESCRIPTION: 'node description',
+}
+
+# label, publication date, genre, MPAA rating, box office, directors, screenwriters, cast, executive producers
+FILMS = [
+    ('Good Will Hunting', '1997-12-05', 'drama film', 'R', 225933435, ['Gus Van Sant'],
+     ['Matt Damon', 'Ben Affleck'], ['Matt Damon', 'Robin Williams', 'Ben Affleck'], ['Bob Weinstein']),
+    ('The Bridge on the River Kwai', '1957-10-02', 'war film', 'PG', 27200000, ['David Lean'],
+     ['Pierre Boulle'], ['Alec Guinness', 'William Holden'], []),
+    ('The Masked Gang: Cyprus', '2008-01-11', 'comedy film', None, None, ['Murat Aslan'],
+     ['Murat Aslan', 'Cem Yilmaz'], ['Mehmet Ali Erbil'], []),
+    ('The Godfather', '1972-03-15', 'crime film', 'R', 246120986, ['Francis Ford Coppola'],
+     ['Mario Puzo', 'Francis Ford Coppola'], ['Marlon Brando', 'Al Pacino'], []),
+    ('Good Neighbors', '2010-09-12', 'thriller film', 'R', None, ['Jacob Tierney'], ['Jacob Tierney'],
+     ['Jay Baruchel', 'Scott Speedman'], []),
+    ('Weathering with You', '2019-07-19', 'animated film', 'PG-13', 193800000, ['Makoto Shinkai'],
+     ['Makoto Shinkai'], ['Kotaro Daigo'], []),
+    ('The Princess and the Frog', '2009-11-25', 'animated film', 'G', 270997378, ['Ron Clements', 'John Musker'],
+     ['Ron Clements', 'John Musker'], ['Anika Noni Rose'], ['John Lasseter']),
+    ('X-Men: First Class', '2011-05-25', 'superhero film', 'PG-13', 353624124, ['Matthew Vaughn'],
+     ['Matthew Vaughn', 'Jane Goldman'], ['James McAvoy', 'Michael Fassbender', 'Halle Berry'], ['Stan Lee']),
+    ('Hamlet', '1948-05-04', 'drama film', None, 3250000, ['Laurence Olivier'], ['Laurence Olivier'],
+     ['Laurence Olivier', 'Jean Simmons'], []),
+    ('Hamlet', '1996-12-25', 'drama film', 'PG-13', 4708156, ['Kenneth Branagh'], ['Kenneth Branagh'],
+     ['Kenneth Branagh', 'Kate Winslet'], []),
+    ('Othello', '1995-12-14', 'drama film', 'R', 2844379, ['Oliver Parker'], ['Oliver Parker'],
+     ['Laurence Fishburne', 'Kenneth Branagh'], []),
+    ('The Lion King', '1994-06-15', 'animated film', 'G', 968483777, ['Roger Allers', 'Rob Minkoff'],
+     ['Irene Mecchi'], ['Matthew Broderick', 'James Earl Jones'], []),
+    ('Pocahontas', '1995-06-10', 'animated film', 'G', 346079773, ['Mike Gabriel', 'Eric Goldberg'],
+     ['Carl Binder'], ['Irene Bedard', 'Mel Gibson'], []),
+    ('The Beauty and the Beast', '1991-11-13', 'animated film', 'G', 424967620,
+     ['Gary Trousdale', 'Kirk Wise'], ['Linda Woolverton'], ['Paige O\'Hara', 'Robby Benson'], []),
+    ('Speed', '1994-06-10', 'action film', 'R', 350448145, ['Jan de Bont'], ['Graham Yost'],
+     ['Keanu Reeves', 'Sandra Bullock'], []),
+    ('Gravity', '2013-08-28', 'science fiction film', 'PG-13', 723192705, ['Alfonso Cuaron'],
+     ['Alfonso Cuaron'], ['Sandra Bullock', 'George Clooney'], []),
+]
+
+
+class FixtureTagger:
+    '''
+    Stand-in for flair's SequenceTagger.load('ner') (a network download), for the offline replay: the entities of
+    the benchmark questions are all found by the label matching of MessageDecomposer, whose NER fallback never
+    runs on them. predict() leaves the sentence without spans, as the model does on a question without names.
+    '''
+    def predict(self, sentence):
+        pass
+
+
+class World(NamedTuple):
+    '''
+    Entities and triples of a fixture. objects of `triples` are QIDs (entities) or python values (literals:
+    str, int, or 'YYYY-MM-DD' dates for P577)
+    '''
+    labels: dict        # QID -> label
+    descriptions: dict  # QID -> description
+    kinds: dict         # QID -> 'film' | 'human' | 'other'
+    triples: list       # (subject QID, PID, object)
+    crowd: list         # (entity QID, PID, value, majority answer, support votes, reject votes, fix value)
+    held_out: list      # triples of the embeddings only, missing from the graph
+    relations: dict     # PID (or full IRI) -> label, as in relations.csv
+    links: tuple = ()   # (subjects, relations, objects): bulk entity links as index arrays into labels / relations
+
+
+class _WorldBuilder:
+    def __init__(self, first_qid: int = FIRST_QID):
+        self.world = World({}, {}, {}, [], [], [], dict(RELATIONS))
+        self.next_qid = first_qid
+        self.by_label = {}
+
+    def entity(self, label: str, kind: str, description: str, unique: bool = True) -> str:
+        # unique=False: always a new entity, also if the label exists (films with the same title)
+        if unique and label in self.by_label:
+            return self.by_label[label]
+        qid = f'Q{self.next_qid}'
+        self.next_qid += 1
+        self.world.labels[qid] = label
+        self.world.descriptions[qid] = description
+        self.world.kinds[qid] = kind
+        self.by_label.setdefault(label, qid)
+        return qid
+
+
+def curated_world() -> World:
+    ''' The films and people of the benchmark questions, with a few crowd answers '''
+    builder = _WorldBuilder()
+    _add_curated(builder)
+    return builder.world
+
+
+def _add_curated(builder: _WorldBuilder):
+    world = builder.world
+    film_class = builder.entity('film', 'other', 'sequence of images that give the impression of movement')
+    human_class = builder.entity('human', 'other', 'common name of Homo sapiens')
+    work_class = builder.entity('work of art', 'other', 'aesthetic item or artistic creation')
+    world.triples.append((film_class, 'P279', work_class))
+
+    films = {}
+    for label, date, genre, rating, box_office, directors, writers, cast, producers in FILMS:
+        film = builder.entity(label, 'film', f'{date[:4]} film directed by {directors[0]}', unique=False)
+        films.setdefault(label, film)
+        genre_id = builder.entity(genre, 'other', 'film genre')
+        world.triples.extend([(film, 'P31', film_class), (film, 'P577', date), (film, 'P136', genre_id)])
+        if rating:
+            rating_id = builder.entity(rating, 'other', 'Motion Picture Association film rating')
+            world.triples.append((film, 'P1657', rating_id))
+        if box_office:
+            world.triples.append((film, 'P2142', box_office))
+        for relation, people in (('P57', directors), ('P58', writers), ('P161', cast), ('P1431', producers)):
+            for person in people:
+                human = builder.entity(person, 'human', 'film person')
+                world.triples.append((film, relation, human))
+
+    for qid, kind in list(world.kinds.items()):
+        if kind == 'human':
+            image = f'{int(qid[1:]) % 9000:04d}/{qid.lower()}.jpg'
+            world.triples.extend([(qid, 'P31', human_class), (qid, 'P18', image)])
+
+    # Answered by the embeddings only, as the embedding questions of the course
+    held_out = {(films['X-Men: First Class'], 'P1431'), (films['Speed'], 'P161'), (films['Gravity'], 'P136')}
+    world.held_out.extend(triple for triple in world.triples if triple[:2] in held_out)
+    world.triples[:] = [triple for triple in world.triples if triple[:2] not in held_out]
+
+    # Crowd: a wrong box office corrected by the workers and a confirmed director
+    world.crowd.append((films['The Princess and the Frog'], 'P2142', '270997378', 2, 0, 3, '267000000'))
+    world.crowd.append((films['Good Will Hunting'], 'P57', builder.by_label['Gus Van Sant'], 1, 3, 0, None))
+
+
+def _numbered(words_a: list, words_b: list, i: int, template: str) -> str:
+    # i-th combination of the two word lists, numbered once the combinations are used up
+    a, b = i % len(words_a), i // len(words_a) % len(words_b)
+    label = template.format(words_a[a], words_b[b])
+    rounds = i // (len(words_a) * len(words_b))
+    return f'{label} {rounds + 1}' if rounds else label
+
+
+def synthetic_world(n_entities: int, seed: int = 0) -> World:
+    '''
+    curated_world() extended to n_entities with generated films, people and other entities (awards, places, ...):
+    17% films, 6% of them sharing the label of another film, 45% people. Every generated film has a publication date,
+    a genre, 1-2 directors and screenwriters and 2-8 cast members, often a rating and a box office; people are picked
+    with a skewed popularity, so some of them appear in many films. 1% of the films get a crowd answer. The other
+    statements of the real graph (countries, awards, ...) are random links on generated relations.
+    '''
+    rng = np.random.default_rng(seed)
+    builder = _WorldBuilder()
+    _add_curated(builder)
+    world = builder.world
+    film_class, human_class = builder.by_label['film'], builder.by_label['human']
+    genres = [builder.entity(genre, 'other', 'film genre') for genre in GENRES]
+    ratings = [builder.entity(rating, 'other', 'Motion Picture Association film rating') for rating in RATINGS]
+    for i in range(N_RELATIONS - len(world.relations)):
+        world.relations[f'P{90000 + i}'] = f'{NOUNS[i % len(NOUNS)].lower()} property {i // len(NOUNS) + 1}'
+
+    n_new = max(n_entities - len(world.labels), 0)
+    first_new = len(world.labels)
+    n_films, n_humans = int(n_new * FILM_SHARE), int(n_new * HUMAN_SHARE)
+    n_others = n_new - n_films - n_humans
+
+    humans = []
+    for i in range(n_humans):
+        label = _numbered(FIRST_NAMES, LAST_NAMES, i, '{} {}')
+        human = builder.entity(label, 'human', OCCUPATIONS[i % len(OCCUPATIONS)], unique=False)
+        humans.append(human)
+        world.triples.append((human, 'P31', human_class))
+        if rng.random() < 0.3:
+            world.triples.append((human, 'P18', f'{i % 9000:04d}/{human.lower()}.jpg'))
+    for i in range(n_others):
+        builder.entity(_numbered(ADJECTIVES, NOUNS, i, '{} {} Award'), 'other', 'award', unique=False)
+
+    film_labels = [_numbered(ADJECTIVES, NOUNS, i, 'The {} {}') for i in range(n_films)]
+    for i in rng.choice(n_films, int(n_films * DUPLICATE_SHARE), replace=False) if n_films else []:
+        film_labels[i] = film_labels[rng.integers(n_films)]
+
+    def people(low: int, high: int) -> list:
+        # Popolarità sbilanciata: gli indici bassi escono molto più spesso
+        count = rng.integers(low, high + 1)
+        return [humans[int(len(humans) * rng.random() ** 3)] for _ in range(count)] if humans else []
+
+    for label in film_labels:
+        date = f'{rng.integers(1920, 2024)}-{rng.integers(1, 13):02d}-{rng.integers(1, 29):02d}'
+        directors = people(1, 2)
+        director_label = world.labels[directors[0]] if directors else 'an unknown director'
+        film = builder.entity(label, 'film', f'{date[:4]} film directed by {director_label}', unique=False)
+        world.triples.extend([(film, 'P31', film_class), (film, 'P577', date),
+                              (film, 'P136', genres[rng.integers(len(genres))])])
+        if rng.random() < 0.6:
+            world.triples.append((film, 'P1657', ratings[rng.integers(len(ratings))]))
+        box_office = int(rng.integers(10 ** 5, 10 ** 9)) if rng.random() < 0.5 else None
+        if box_office:
+            world.triples.append((film, 'P2142', box_office))
+        producers = people(1, 1) if rng.random() < 0.2 else []
+        for relation, persons in (('P57', directors), ('P58', people(1, 2)), ('P161', people(2, 8)),
+                                  ('P1431', producers)):
+            world.triples.extend((film, relation, person) for person in dict.fromkeys(persons))
+
+        if box_office and rng.random() < CROWD_SHARE * 2:
+            majority = int(rng.choice([0, 1, 2], p=[0.1, 0.6, 0.3]))
+            support, reject = {0: (1, 1), 1: (3, 0), 2: (0, 3)}[majority]
+            fix = str(int(box_office * rng.uniform(0.8, 1.2))) if majority == 2 and rng.random() < 0.5 else None
+            world.crowd.append((film, 'P2142', str(box_office), majority, support, reject, fix))
+
+    if not n_new:
+        return world
+    n_extra = n_new * EXTRA_TRIPLES
+    links = (rng.integers(first_new, len(world.labels), size=n_extra, dtype=np.int32),
+             rng.integers(len(RELATIONS), len(world.relations), size=n_extra, dtype=np.int32),
+             (len(world.labels) * rng.random(n_extra) ** 2).astype(np.int32))
+    return world._replace(links=links)
+
+
+def _relation_iri(relation: str) -> str:
+    return relation if relation.startswith('http') else WDT + relation
+
+
+def _escape(literal: str) -> str:
+    return literal.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _nt_object(relation: str, value, entities: dict) -> str:
+    if isinstance(value, str) and value in entities:
+        return f'<{WD}{value}>'
+    if relation == 'P577':
+        return f'"{value}"^^<{XSD}date>'
+    if isinstance(value, (int, np.integer)):
+        return f'"{value}"^^<{XSD}decimal>'
+    return f'"{_escape(str(value))}"'
+
+
+def write_graph(world: World, path: str = GRAPH_PATH, chunk_size: int = 1000000):
+    with open(path, 'w', encoding='utf-8') as file:
+        for qid, label in world.labels.items():
+            file.write(f'<{WD}{qid}> <{RDFS_LABEL}> "{_escape(label)}"@en .\n')
+            file.write(f'<{WD}{qid}> <{SCHEMA_DESCRIPTION}> "{_escape(world.descriptions[qid])}"@en .\n')
+        for subject, relation, value in world.triples:
+            file.write(f'<{WD}{subject}> <{_relation_iri(relation)}> {_nt_object(relation, value, world.labels)} .\n')
+        if world.links:
+            entities = [f'<{WD}{qid}>' for qid in world.labels]
+            relations = [f'<{_relation_iri(relation)}>' for relation in world.relations]
+            for start in range(0, len(world.links[0]), chunk_size):
+                subjects, predicates, objects = (column[start:start + chunk_size].tolist() for column in world.links)
+                file.writelines(f'{entities[s]} {relations[p]} {entities[o]} .\n'
+                                for s, p, o in zip(subjects, predicates, objects))
+
+
+def write_tables(world: World):
+    ''' films_clean.csv, humans_clean.csv, entities_clean.csv, film_double.csv and relations.csv '''
+    entities = pd.DataFrame({'ID': [WD + qid for qid in world.labels], 'Label': list(world.labels.values()),
+                             'kind': list(world.kinds.values())})
+    films = entities[entities['kind'] == 'film'][['ID', 'Label']]
+    films.to_csv(FILM_PATH, index=False)
+    films[films['Label'].duplicated(keep=False)].to_csv(FILM_DOUBLE_PATH, index=False)
+    entities[entities['kind'] == 'human'][['ID', 'Label']].to_csv(HUMANS_PATH, index=False)
+    entities[['ID', 'Label']].to_csv(ENTITIES_PATH, index=False)
+    pd.DataFrame({'ID': [_relation_iri(relation) for relation in world.relations],
+                  'Label': list(world.relations.values())}).to_csv(RELATIONS_PATH, index=False)
+
+
+def train_embeddings(world: World, dim: int = EMBEDDING_DIM, epochs: int = 20, seed: int = 0,
+                     chunk_size: int = 200000) -> tuple:
+    '''
+    TransE-shaped embeddings (head + relation ~ tail) of the entity-to-entity triples: random vectors, then a
+    few passes moving every tail towards the mean of head + relation. Not trained, but the nearest neighbours of
+    head + relation are the true tails often enough to exercise the embedding answers.
+    '''
+    rng = np.random.default_rng(seed)
+    qids = list(world.labels)
+    relations = list(world.relations)
+    entity_index = {qid: i for i, qid in enumerate(qids)}
+    relation_index = {relation: i for i, relation in enumerate(relations)}
+    entity_embeds = rng.standard_normal(size=(len(qids), dim), dtype=np.float32)
+    relation_embeds = 0.5 * rng.standard_normal(size=(len(relations), dim), dtype=np.float32)
+
+    edges = np.fromiter(itertools.chain.from_iterable(
+        (entity_index[s], relation_index[r], entity_index[o])
+        for s, r, o in itertools.chain(world.triples, world.held_out) if isinstance(o, str) and o in entity_index),
+        dtype=np.int64).reshape(-1, 3)
+    if world.links:
+        edges = np.concatenate([edges, np.stack(world.links, axis=1).astype(np.int64)])
+    counts = np.bincount(edges[:, 2], minlength=len(qids)).astype(np.float32)
+    for _ in range(epochs if len(edges) else 0):
+        sums = np.zeros_like(entity_embeds)
+        for start in range(0, len(edges), chunk_size):  # head + relation of chunk_size edges at a time
+            chunk = edges[start:start + chunk_size]
+            np.add.at(sums, chunk[:, 2], entity_embeds[chunk[:, 0]] + relation_embeds[chunk[:, 1]])
+        for start in range(0, len(qids), chunk_size):  # in blocks, without temporaries of the whole matrix
+            block = slice(start, start + chunk_size)
+            tails = counts[block] > 0
+            embeds = entity_embeds[block]
+            embeds[tails] = 0.5 * embeds[tails] + 0.5 * sums[block][tails] / counts[block][tails, None]
+    return qids, relations, entity_embeds, relation_embeds
+
+
+def write_embeddings(world: World, dim: int = EMBEDDING_DIM, epochs: int = 20, seed: int = 0) -> np.ndarray:
+    qids, relations, entity_embeds, relation_embeds = train_embeddings(world, dim, epochs, seed)
+    np.save(ENTITY_EMBEDS_PATH, entity_embeds)
+    np.save(RELATION_EMBEDS_PATH, relation_embeds)
+    with open(ENTITY_IDS_PATH, 'w', encoding='utf-8') as file:
+        file.writelines(f'{i}\t{WD}{qid}\n' for i, qid in enumerate(qids))
+    with open(RELATION_IDS_PATH, 'w', encoding='utf-8') as file:
+        file.writelines(f'{i}\t{_relation_iri(relation)}\n' for i, relation in enumerate(relations))
+    return entity_embeds
+
+
+def write_similarity(world: World, entity_embeds: np.ndarray, dense: bool = None, k: int = TOP_K):
+    '''
+    Film x film cosine similarity of the embeddings, in the formats of recommender_utils: top-k neighbours
+    (similarity_topk.npz) always, the dense .parquet and float32 .npy if dense (default: up to DENSE_MAX_FILMS films)
+    '''
+    film_rows = [i for i, kind in enumerate(world.kinds.values()) if kind == 'film']
+    film_qids = np.asarray(list(world.labels), dtype=str)[film_rows]
+    vectors = entity_embeds[film_rows]
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    n_films = len(film_rows)
+    dense = n_films <= DENSE_MAX_FILMS if dense is None else dense
+    k = min(k, n_films)
+    chunk_size = max(1, 2 ** 24 // max(n_films, 1))  # rows per block: ~16M similarities at a time
+
+    matrix = np.lib.format.open_memmap(MMAP_SIMILARITY_PATH, mode='w+', dtype=np.float32,
+                                       shape=(n_films, n_films)) if dense else None
+    indices = np.empty((n_films, k), dtype=np.int32)
+    data = np.empty((n_films, k), dtype=np.float32)
+    for start in range(0, n_films, chunk_size):
+        values = vectors[start:start + chunk_size] @ vectors.T
+        if matrix is not None:
+            matrix[start:start + len(values)] = values
+        top = np.argpartition(-values, k - 1, axis=1)[:, :k]
+        top_values = np.take_along_axis(values, top, axis=1)
+        order = np.argsort(-top_values, axis=1)
+        indices[start:start + len(values)] = np.take_along_axis(top, order, axis=1)
+        data[start:start + len(values)] = np.take_along_axis(top_values, order, axis=1)
+    np.savez(SPARSE_SIMILARITY_PATH, indptr=np.arange(0, n_films * k + 1, k, dtype=np.int64), indices=indices.ravel(),
+             data=data.ravel(), row_qids=film_qids, col_qids=film_qids)
+
+    if matrix is not None:
+        matrix.flush()
+        np.savez(qids_path(MMAP_SIMILARITY_PATH), row_qids=film_qids, col_qids=film_qids)
+        pd.DataFrame(np.asarray(matrix), index=film_qids, columns=film_qids).to_parquet(SIMILARITY_PATH,
+                                                                                        engine='pyarrow')
+        del matrix
+
+
+def write_crowd(world: World, path: str = CROWD_AGGREGATED_PATH):
+    hit_type = 'SYN'
+    rows = pd.DataFrame([(hit_id, float(majority), support, reject, entity, relation, value, hit_type, None, fix)
+                         for hit_id, (entity, relation, value, majority, support, reject, fix)
+                         in enumerate(world.crowd, 1)], columns=AGGREGATED_COLUMNS)
+    counts = rows[['CountAnswerID1', 'CountAnswerID2']].set_axis(ANSWER_IDS, axis=1)
+    rows['Kappa'] = rows['HITTypeId'].map(fleiss_kappa(kappa_statistics(counts, rows['HITTypeId'])))
+    rows.to_csv(path, index=False)
+
+
+def write_fixture(root: str, world: World = None, dim: int = EMBEDDING_DIM, dense: bool = None,
+                  verbose: bool = False) -> str:
+    ''' Write every dataset file of `world` (default: curated_world()) under root/dataset, returns root '''
+    world = world or curated_world()
+    cwd = os.getcwd()
+    for directory in (os.path.dirname(path) for path in (GRAPH_PATH, ENTITY_EMBEDS_PATH, MMAP_SIMILARITY_PATH,
+                                                          CROWD_AGGREGATED_PATH)):
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+    os.chdir(root)
+    # Few generated entities are heads and tails at the same time, two passes are enough for the large worlds
+    epochs = 20 if len(world.labels) < 10000 else 2
+    steps = [('graph', lambda: write_graph(world)), ('tables', lambda: write_tables(world)),
+             ('embeddings', lambda: write_embeddings(world, dim, epochs)),
+             ('similarity', lambda: write_similarity(world, np.load(ENTITY_EMBEDS_PATH, mmap_mode='r'), dense)),
+             ('crowd', lambda: write_crowd(world))]
+    try:
+        for name, step in steps:
+            start = time.perf_counter()
+            step()
+            if verbose:
+                print(f"Wrote the {name} in {time.perf_counter() - start:.1f}s")
+    finally:
+        os.chdir(cwd)
+    return root
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write the benchmark fixture datasets.')
+    parser.add_argument('root', help='directory that gets the dataset/ tree')
+    parser.add_argument('--entities', type=int, help='scale the fixture to this many entities (synthetic_world)')
+    parser.add_argument('--dim', type=int, default=EMBEDDING_DIM, help='embedding dimension')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dense', choices=['auto', 'yes', 'no'], default='auto',
+                        help=f'write the dense similarity formats (auto: up to {DENSE_MAX_FILMS} films)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    world = synthetic_world(args.entities, args.seed) if args.entities else curated_world()
+    n_triples = len(world.triples) + (len(world.links[0]) if world.links else 0)
+    print(f"Generated {len(world.labels)} entities, {n_triples} triples in {time.perf_counter() - start:.1f}s")
+    write_fixture(args.root, world, args.dim, {'auto': None, 'yes': True, 'no': False}[args.dense], verbose=True)
+    print(f"Fixture written to {os.path.join(args.root, 'dataset')}")
@@ -0,0 +1,183 @@
+"""
+Offline load test of the bot against the local mock Speakeasy server (benchmarks/mock_speakeasy_server.py).
+
+Opens N simulated rooms, fires questions at a fixed rate (round robin over the rooms) and measures the end-to-end
+latency from the moment a question is posted until the bot's answer reaches the server.
+
+    python -m benchmarks.load_test --rooms 10 --rate 5 --duration 30              # full Agent (needs the datasets)
+    python -m benchmarks.load_test --agent echo --rooms 50 --rate 50 --duration 10 # transport only
+    python -m benchmarks.load_test --workers 4                                     # pre-fork workers, with memory
+
+The first bot message of every room (the welcome message) is awaited during warm-up and not measured. Answers are
+matched to questions in FIFO order per room. The outbox of the agent merges the backlog of a room into one post
+under load; the harness sets its separator to POST_SEPARATOR and counts every part of a merged post as an answer.
+"""
+import argparse
+import json
+import math
+import threading
+import time
+
+from collections import deque
+
+from benchmarks.mock_speakeasy_server import MockSpeakeasyServer
+
+QUESTIONS = [
+    'Who is the director of Good Will Hunting?',
+    'Who directed The Bridge on the River Kwai?',
+    'Who is the screenwriter of The Masked Gang: Cyprus?',
+    'When was The Godfather released?',
+    'What is the genre of Good Neighbors?',
+    'What is the MPAA film rating of Weathering with You?',
+    'What is the box office of The Princess and the Frog?',
+    'Who is the executive producer of X-Men: First Class?',
+    'Recommend movies similar to Hamlet and Othello.',
+    'Given that I like The Lion King, Pocahontas, and The Beauty and the Beast, can you recommend some movies?',
+    'Show me a picture of Halle Berry.',
+    'Let me know what Sandra Bullock looks like.',
+]
+
+# Separator of the messages merged by the outbox into one post, never part of an answer (ASCII record separator)
+POST_SEPARATOR = '\x1e'
+
+
+def percentile(sorted_values, p: float) -> float:
+    """ Nearest-rank percentile of an already sorted list. """
+    if not sorted_values:
+        return float('nan')
+    rank = max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}  # room_id -> deque of perf_counter() send times
+        self.welcomed = set()
+        self.latencies = []
+        self.unmatched_bot_messages = 0
+
+    def question_sent(self, room_id: str, sent_at: float):
+        with self.lock:
+            self.pending.setdefault(room_id, deque()).append(sent_at)
+
+    def bot_message(self, room_id: str, text: str, received_at: float):
+        with self.lock:
+            for _ in text.split(POST_SEPARATOR):
+                if room_id not in self.welcomed:
+                    self.welcomed.add(room_id)
+                    continue
+                pending = self.pending.get(room_id)
+                if pending:
+                    self.latencies.append(received_at - pending.popleft())
+                else:
+                    self.unmatched_bot_messages += 1
+
+    def n_pending(self) -> int:
+        with self.lock:
+            return sum(len(queue) for queue in self.pending.values())
+
+
+class EchoAgent:
+    """ Minimal bot on top of speakeasypy that answers with the question, to measure the transport overhead. """
+    def __init__(self, username, password, host):
+        from speakeasypy import Speakeasy
+        self.speakeasy = Speakeasy(host=host, username=username, password=password,
+                                   pool_size=8, pool_threads=8, non_blocking_posts=True)
+        self.speakeasy.login()
+
+    def listen(self):
+        while True:
+            for room in self.speakeasy.get_rooms(active=True):
+                if not room.initiated:
+                    room.post_messages(f'Hello! This is a welcome message from {room.my_alias}.')
+                    room.initiated = True
+            for event in self.speakeasy.get_new_events(active=True, only_partner=True):
+                if event.kind == 'message':
+                    event.room.post_messages(event.item.message)
+                event.room.mark_as_processed(event.item)
+
+
+def build_agent(kind: str, host: str, workers: int = 1):
+    if kind == 'echo':
+        agent = EchoAgent('loadtest', 'loadtest', host=host)
+    else:
+        from src.bot.speakeasy_bot import Agent
+        agent = Agent('loadtest', 'loadtest', host=host, workers=workers)
+    agent.speakeasy.outbox.separator = POST_SEPARATOR
+    return agent
+
+
+def run(args) -> dict:
+    recorder = LatencyRecorder()
+    server = MockSpeakeasyServer(on_bot_message=recorder.bot_message).start()
+    room_ids = [server.open_room() for _ in range(args.rooms)]
+
+    agent = build_agent(args.agent, server.url, args.workers)
+    threading.Thread(target=agent.listen, name='agent', daemon=True).start()
+
+    # Warm-up: wait for the welcome message of every room
+    deadline = time.perf_counter() + args.warmup
+    while len(recorder.welcomed) < len(room_ids) and time.perf_counter() < deadline:
+        time.sleep(0.05)
+
+    n_questions = int(args.rate * args.duration)
+    start = time.perf_counter()
+    for i in range(n_questions):
+        delay = start + i / args.rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        room_id = room_ids[i % len(room_ids)]
+        recorder.question_sent(room_id, time.perf_counter())
+        server.send_user_message(room_id, QUESTIONS[i % len(QUESTIONS)])
+
+    deadline = time.perf_counter() + args.drain_timeout
+    while recorder.n_pending() and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    # The server is left running (daemon thread) so the agent can still flush its outbox and log out at exit
+
+    latencies = sorted(recorder.latencies)
+    workers = getattr(agent, 'workers', None)
+    return {
+        'agent': args.agent,
+        'rooms': args.rooms,
+        'target_rate': args.rate,
+        'questions': n_questions,
+        'answered': len(latencies),
+        'unanswered': recorder.n_pending(),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_qps': round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        'latency_ms': {name: round(percentile(latencies, p) * 1000, 2)
+                       for name, p in (('p50', 50), ('p90', 90), ('p95', 95), ('p99', 99), ('max', 100))},
+        'unmatched_bot_messages': recorder.unmatched_bot_messages,
+        'server_requests': server.request_count,
+        'memory_mb': workers.memory_report() if workers is not None else {},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the bot against a local mock Speakeasy server.')
+    parser.add_argument('--agent', choices=['full', 'echo'], default='full')
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=1, help='pre-fork worker processes of the full agent')
+    parser.add_argument('--rate', type=float, default=5.0, help='questions per second (over all rooms)')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds of question traffic')
+    parser.add_argument('--warmup', type=float, default=30.0, help='max seconds to wait for the welcome messages')
+    parser.add_argument('--drain-timeout', type=float, default=60.0, help='max seconds to wait for late answers')
+    parser.add_argument('--json', help='also write the report to this file')
+    parser.add_argument('--log-level', default='WARNING', help='level of the bot loggers during the run')
+    args = parser.parse_args()
+
+    from src.bot.log import setup_logging
+    setup_logging(args.log_level)
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
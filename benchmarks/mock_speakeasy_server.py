@@ -0,0 +1,244 @@
+"""
+Local stand-in for the Speakeasy server (https://speakeasy.ifi.uzh.ch), implementing the endpoints used by
+speakeasypy's ChatApi / UserApi, so the bot can be run and load tested offline.
+
+    python -m benchmarks.mock_speakeasy_server --port 8080 --rooms 2
+
+Besides the API endpoints, two helper endpoints drive the "human" side of the chat:
+    POST /mock/rooms             open a new room, returns {"uid": ...}
+    POST /mock/room/{roomId}     post the (plain text) body as the chat partner
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+ROOM_DURATION_MS = 60 * 60 * 1000
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class MockRoom:
+    def __init__(self, uid: str, bot_alias: str, user_alias: str, duration_ms: int):
+        self.uid = uid
+        self.bot_alias = bot_alias
+        self.user_alias = user_alias
+        self.start_time = _now_ms()
+        self.end_time = self.start_time + duration_ms
+        self.messages = []
+        self.reactions = []
+
+    def info(self) -> dict:
+        return {
+            'assignment': False,
+            'formRef': '',
+            'uid': self.uid,
+            'remainingTime': max(self.end_time - _now_ms(), 0),
+            'userAliases': [self.bot_alias, self.user_alias],
+            'alias': self.bot_alias,
+            'prompt': '',
+            'markAsNoFeedback': False,
+            'startTime': self.start_time,
+        }
+
+    def add_message(self, author_alias: str, text: str) -> dict:
+        # Strictly increasing timestamps, so that 'since' never skips a message
+        time_stamp = max(_now_ms(), self.messages[-1]['timeStamp'] + 1) if self.messages else _now_ms()
+        message = {'timeStamp': time_stamp, 'authorAlias': author_alias, 'ordinal': len(self.messages),
+                   'message': text}
+        self.messages.append(message)
+        return message
+
+    def state(self, since: int) -> dict:
+        return {
+            'info': self.info(),
+            'messages': [m for m in self.messages if m['timeStamp'] >= since],
+            'reactions': list(self.reactions),
+        }
+
+
+class MockSpeakeasyServer:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, bot_alias: str = 'bot', on_bot_message=None):
+        """MockSpeakeasyServer - in-memory Speakeasy backend served from a background thread.
+
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind, 0 picks a free one (see `url`).
+            bot_alias (str): Alias of the bot in every room.
+            on_bot_message (callable, optional): Called as on_bot_message(room_id, text, received_at) for every
+                message the bot posts (received_at is a time.perf_counter() value), e.g. to measure latencies.
+        """
+        self.bot_alias = bot_alias
+        self.on_bot_message = on_bot_message
+        self.rooms = {}
+        self.sessions = set()
+        self.lock = threading.Lock()
+        self.request_count = 0
+
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'MockSpeakeasyServer':
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='mock-speakeasy', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def open_room(self, user_alias: str = None, duration_ms: int = ROOM_DURATION_MS) -> str:
+        uid = uuid.uuid4().hex[:12]
+        with self.lock:
+            self.rooms[uid] = MockRoom(uid, self.bot_alias, user_alias or f'user-{len(self.rooms)}', duration_ms)
+        return uid
+
+    def send_user_message(self, room_id: str, text: str) -> int:
+        """ Post `text` as the chat partner of `room_id` and return the ordinal of the message. """
+        with self.lock:
+            room = self.rooms[room_id]
+            return room.add_message(room.user_alias, text)['ordinal']
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real server
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, obj, status=200):
+                body = json.dumps(obj).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            def _authorized(self, query) -> bool:
+                if query.get('session', [None])[0] in server.sessions:
+                    return True
+                self._send_json({'description': 'Unauthorized'}, status=401)
+                return False
+
+            def _room(self, room_id):
+                room = server.rooms.get(room_id)
+                if room is None:
+                    self._send_json({'description': f'Room {room_id} not found'}, status=404)
+                return room
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                server.request_count += 1
+
+                if url.path == '/api/logout':
+                    server.sessions.discard(query.get('session', [None])[0])
+                    return self._send_json({'description': 'Logged out'})
+                if url.path == '/api/user/current':
+                    if self._authorized(query):
+                        self._send_json({'id': '1', 'username': server.bot_alias, 'role': 'BOT'})
+                    return
+                if not self._authorized(query):
+                    return
+                if url.path == '/api/rooms':
+                    with server.lock:
+                        return self._send_json({'rooms': [room.info() for room in server.rooms.values()]})
+                match = re.fullmatch(r'/api/room/([^/]+)/(-?\d+)', url.path)
+                if match:
+                    with server.lock:
+                        room = self._room(match.group(1))
+                        if room is not None:
+                            self._send_json(room.state(int(match.group(2))))
+                    return
+                self._send_json({'description': f'Unknown endpoint {url.path}'}, status=404)
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                body = self._read_body()
+                received_at = time.perf_counter()
+                server.request_count += 1
+
+                if url.path == '/api/login':
+                    token = uuid.uuid4().hex
+                    server.sessions.add(token)
+                    username = json.loads(body or b'{}').get('username', server.bot_alias)
+                    return self._send_json({
+                        'userDetails': {'id': '1', 'username': username, 'role': 'BOT'},
+                        'sessionId': uuid.uuid4().hex,
+                        'sessionToken': token,
+                        'startTime': _now_ms(),
+                    })
+                if url.path == '/mock/rooms':
+                    return self._send_json({'uid': server.open_room()})
+                match = re.fullmatch(r'/mock/room/([^/]+)', url.path)
+                if match:
+                    if self._room(match.group(1)) is not None:
+                        ordinal = server.send_user_message(match.group(1), body.decode('utf-8'))
+                        self._send_json({'ordinal': ordinal})
+                    return
+
+                if not self._authorized(query):
+                    return
+                match = re.fullmatch(r'/api/room/([^/]+)/reaction', url.path)
+                if match:
+                    with server.lock:
+                        room = self._room(match.group(1))
+                        if room is not None:
+                            room.reactions.append(json.loads(body))
+                            self._send_json({'description': 'Reaction posted'})
+                    return
+                match = re.fullmatch(r'/api/room/([^/]+)', url.path)
+                if match:
+                    text = body.decode('utf-8')
+                    with server.lock:
+                        room = self._room(match.group(1))
+                        if room is None:
+                            return
+                        room.add_message(server.bot_alias, text)
+                    self._send_json({'description': 'Message posted'})
+                    if server.on_bot_message is not None:
+                        server.on_bot_message(match.group(1), text, received_at)
+                    return
+                self._send_json({'description': f'Unknown endpoint {url.path}'}, status=404)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local mock Speakeasy server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--rooms', type=int, default=1, help='rooms opened at start-up')
+    args = parser.parse_args()
+
+    server = MockSpeakeasyServer(host=args.host, port=args.port).start()
+    for _ in range(args.rooms):
+        print(f"Opened room {server.open_room()}")
+    print(f"Mock Speakeasy server listening on {server.url} (Ctrl+C to stop)")
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
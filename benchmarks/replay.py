@@ -0,0 +1,188 @@
+"""
+Replay a corpus of questions through MessageDecomposer and MessageComposer on the fixture datasets
+(benchmarks/fixtures.py) and compare latency, throughput and memory with a stored baseline.
+
+    python -m benchmarks.replay                                  # fixture in a temporary directory
+    python -m benchmarks.replay --rounds 20 --save-baseline      # store the run as benchmarks/replay_baseline.json
+    python -m benchmarks.replay --fixture /tmp/bot_fixture --tolerance 0.1
+    python -m benchmarks.replay --entities 100000 --baseline benchmarks/replay_baseline_100k.json   # scaled data
+
+The components are built by src/bot/startup.py as in Agent.__init__, without the Speakeasy connection, from the
+fixture root (all the dataset paths are relative to the working directory). One unmeasured warm-up round comes
+first. The NER model is replaced by fixtures.FixtureTagger, so nothing is downloaded (--real-ner loads flair's
+model, which needs it cached or the network). A metric regresses when it is worse than the baseline by more than --tolerance (relative), or, for the
+number of questions that raised, as soon as it grows; the exit code is then 1. Without a baseline the run fails
+(exit code 2) unless --save-baseline stores it: baselines depend on the machine, none is committed.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from benchmarks.fixtures import FixtureTagger, curated_world, synthetic_world, write_fixture
+from benchmarks.load_test import percentile
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'replay_baseline.json')
+
+# (category, question), about the films and people of the curated fixture
+CORPUS = [
+    ('factual', 'Who is the director of The Bridge on the River Kwai?'),
+    ('factual', 'Who is the screenwriter of The Masked Gang: Cyprus?'),
+    ('factual', 'When was The Godfather released?'),
+    ('factual', 'What is the genre of Good Neighbors?'),
+    ('factual', 'What is the MPAA film rating of Weathering with You?'),
+    ('factual', 'Who is the director of Hamlet?'),
+    ('factual', 'What is The Godfather?'),
+    ('embedding', 'Who is the executive producer of X-Men: First Class?'),
+    ('embedding', 'Who are the cast members of Speed?'),
+    ('embedding', 'What is the genre of Gravity?'),
+    ('multimedia', 'Show me a picture of Halle Berry.'),
+    ('multimedia', 'Let me know what Sandra Bullock looks like.'),
+    ('multimedia', 'What is the image of Kenneth Branagh?'),
+    ('recommendation', 'Recommend movies similar to Hamlet and Othello.'),
+    ('recommendation', 'Given that I like The Lion King, Pocahontas, and The Beauty and the Beast, can you recommend '
+                       'some movies?'),
+    ('recommendation', 'Recommend movies like The Godfather.'),
+    ('crowd', 'What is the box office of The Princess and the Frog?'),
+    ('crowd', 'Who is the director of Good Will Hunting?'),
+]
+
+# metric -> True if higher is better
+METRICS = {'p50_ms': False, 'p95_ms': False, 'p99_ms': False, 'throughput_qps': True, 'peak_rss_mb': False,
+           'errors': False}
+# Metrics compared without tolerance: any increase is a regression
+EXACT_METRICS = {'errors'}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss: kilobytes on Linux, bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def load_pipeline(workers: int = None, parallel: bool = True, real_ner: bool = False, recommendation_backend=None,
+                  similarity_path=None):
+    ''' The components of Agent.__init__, from the datasets of the working directory '''
+    from src.bot.startup import load_components
+    components, steps, startup_s = load_components(workers, parallel, None if real_ner else FixtureTagger(),
+                                                   recommendation_backend, similarity_path)
+    return components['decomposer'], components['composer'], steps, startup_s
+
+
+def replay(decomposer, composer, rounds: int) -> dict:
+    def answer(question):
+        try:
+            composer.compose(decomposer.decompose(question))
+            return True
+        except Exception:
+            return False
+
+    for _, question in CORPUS:
+        answer(question)
+
+    latencies, errors = {}, {}
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for category, question in CORPUS:
+            question_start = time.perf_counter()
+            ok = answer(question)
+            latencies.setdefault(category, []).append(time.perf_counter() - question_start)
+            errors[category] = errors.get(category, 0) + (not ok)
+    elapsed = time.perf_counter() - start
+
+    def summary(values):
+        values = sorted(values)
+        return {name: round(percentile(values, p) * 1000, 3) for name, p in (('p50_ms', 50), ('p95_ms', 95),
+                                                                             ('p99_ms', 99))}
+    all_latencies = [latency for values in latencies.values() for latency in values]
+    return dict(summary(all_latencies),
+                questions=len(all_latencies),
+                errors=sum(errors.values()),
+                throughput_qps=round(len(all_latencies) / elapsed, 3) if elapsed else 0.0,
+                categories={category: dict(summary(values), errors=errors[category])
+                            for category, values in latencies.items()})
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    ''' Metrics of report worse than the baseline by more than tolerance: [(metric, baseline, current)] '''
+    regressions = []
+    for metric, higher_is_better in METRICS.items():
+        if metric not in baseline and metric not in EXACT_METRICS:
+            continue
+        old, new = baseline.get(metric, 0), report[metric]
+        if metric in EXACT_METRICS:
+            worse = new > old
+        else:
+            worse = new < old / (1 + tolerance) if higher_is_better else new > old * (1 + tolerance)
+        if worse:
+            regressions.append((metric, old, new))
+    return regressions
+
+
+def run(args) -> dict:
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        root = args.fixture or tmp
+        if not os.path.isdir(os.path.join(root, 'dataset')):
+            write_fixture(root, synthetic_world(args.entities) if args.entities else curated_world())
+        os.chdir(root)
+        try:
+            decomposer, composer, steps, startup_s = load_pipeline(args.workers, not args.sequential_startup, args.real_ner,
+                                                                  args.recommendation_backend, args.similarity_path)
+            report = replay(decomposer, composer, args.rounds)
+        finally:
+            os.chdir(cwd)
+    report['entities'] = args.entities
+    report['startup_s'] = round(startup_s, 3)
+    report['startup_steps_s'] = {os.path.basename(step.name): round(step.load_s, 3) for step in steps}
+    report['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay the benchmark questions on the fixture datasets.')
+    parser.add_argument('--rounds', type=int, default=10, help='measured passes over the corpus')
+    parser.add_argument('--fixture', help='fixture root (written there if it has no dataset/), default: temporary')
+    parser.add_argument('--entities', type=int, help='scale the fixture to this many entities (synthetic_world)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes parsing the graph')
+    parser.add_argument('--sequential-startup', action='store_true', help='build the components one by one')
+    parser.add_argument('--real-ner', action='store_true', help="load flair's NER model instead of FixtureTagger")
+    parser.add_argument('--recommendation-backend', choices=['matrix', 'embeddings'])
+    parser.add_argument('--similarity-path', help='similarity file of the matrix backend, relative to the fixture')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    from src.bot.log import setup_logging
+    setup_logging('WARNING')
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}: store one with --save-baseline")
+        sys.exit(2)
+    with open(args.baseline) as file:
+        regressions = compare(report, json.load(file), args.tolerance)
+    for metric, old, new in regressions:
+        print(f"REGRESSION {metric}: {old} -> {new}")
+    if regressions:
+        sys.exit(1)
+    print(f"No regression against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import logging
+import os
+import time
+
+from typing import NamedTuple, Optional
+
+import pandas as pd
+
+from crowdsourcing.crowdsourcing_utils import CROWD_AGGREGATED_PATH
+
+log = logging.getLogger('bot.crowd')  # configured by src.bot.log.setup_logging
+
+
+class CrowdAnswer(NamedTuple):
+    '''
+    Aggregated crowd judgement of the triple (entity, relation, value). majority_answer: 1 = correct,
+    2 = incorrect, 0 = tie (see crowd_preprocessing.ipynb)
+    '''
+    value: Optional[str]
+    majority_answer: int
+    support_votes: int
+    reject_votes: int
+    kappa: float  # Fleiss' kappa of the HIT type, per-HIT number of votes (crowdsourcing_utils.kappa_statistics)
+    corrected_value: Optional[str] = None
+
+    @property
+    def votes(self) -> int:
+        return self.support_votes + self.reject_votes
+
+
+class CrowdStore:
+    '''
+    Aggregated crowd data indexed by (entity QID, relation PID), so checking and answering from the crowd is a
+    single dict lookup. The CSV is reloaded when it changes on disk (e.g. after crowdsourcing_utils.merge_crowd_batch),
+    checked at most every reload_interval seconds, so new batches are picked up without restarting the bot.
+    '''
+    def __init__(self, path: str = CROWD_AGGREGATED_PATH, reload_interval: float = 5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.answers = {}
+        self.__mtime = None
+        self.__last_check = 0.0
+        self.reload()
+
+    def reload(self):
+        # Costruisce il nuovo indice a parte e lo sostituisce in un colpo solo
+        mtime = os.path.getmtime(self.path)
+        answers = {}
+        data = pd.read_csv(self.path, dtype={'Input3ID': str, 'FixValue': str})
+        corrected = data['FixValue'] if 'FixValue' in data.columns else [None] * len(data)
+        for row, corrected_value in zip(data.itertuples(index=False), corrected):
+            answer = CrowdAnswer(
+                value=None if pd.isna(row.Input3ID) else row.Input3ID,
+                majority_answer=int(row.MajorityAnswer),
+                support_votes=int(row.CountAnswerID1),
+                reject_votes=int(row.CountAnswerID2),
+                kappa=float(row.Kappa),
+                corrected_value=None if pd.isna(corrected_value) else str(corrected_value),
+            )
+            self.add(row.Input1ID, row.Input2ID, answer, answers)
+        self.answers = answers
+        self.__mtime = mtime
+
+    def refresh(self) -> bool:
+        ''' Reload the CSV if it changed since the last load. Returns True if it was reloaded. '''
+        now = time.monotonic()
+        if now - self.__last_check < self.reload_interval:
+            return False
+        self.__last_check = now
+        try:
+            if os.path.getmtime(self.path) == self.__mtime:
+                return False
+            self.reload()
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("Could not reload the crowd data from %s, keeping the previous one: %s", self.path, e)
+            return False
+        log.info("Reloaded %d crowd answers from %s", len(self.answers), self.path)
+        return True
+
+    def add(self, entity_id: str, relation_id: str, answer: CrowdAnswer, answers: dict = None):
+        # Se la stessa coppia compare in più HIT si tiene la risposta con più voti
+        answers = self.answers if answers is None else answers
+        key = (self._bare_id(entity_id), self._bare_id(relation_id))
+        previous = answers.get(key)
+        if previous is None or answer.votes >= previous.votes:
+            answers[key] = answer
+
+    @staticmethod
+    def _bare_id(entity_id: str) -> str:
+        # 'http://www.wikidata.org/entity/Q47703' -> 'Q47703'
+        return entity_id.split('/')[-1]
+
+    def get(self, entity_id: str, relation_id: str) -> Optional[CrowdAnswer]:
+        self.refresh()
+        return self.answers.get((self._bare_id(entity_id), self._bare_id(relation_id)))
+
+    def __contains__(self, key: tuple) -> bool:
+        return self.get(*key) is not None
+
+    def __len__(self):
+        return len(self.answers)
@@ -0,0 +1,245 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+CROWD_DATA_PATH = 'dataset/crowd_data/crowd_data.tsv'
+CROWD_AGGREGATED_PATH = 'dataset/crowd_data/crowd_data_aggregated.csv'
+CROWD_STATE_PATH = 'dataset/crowd_data/crowd_state.pkl'  # running counts, see CrowdAggregator.save
+MIN_APPROVAL_RATE = 70  # workers with a lifetime approval rate <= 70% are considered malicious
+
+INPUT_COLUMNS = ['Input1ID', 'Input2ID', 'Input3ID', 'HITTypeId']
+ANSWER_IDS = [1, 2]  # 1 = correct, 2 = incorrect
+AGGREGATED_COLUMNS = ['HITId', 'MajorityAnswer', 'CountAnswerID1', 'CountAnswerID2', 'Input1ID', 'Input2ID',
+                      'Input3ID', 'HITTypeId', 'Kappa', 'FixValue']
+
+
+def kappa_statistics(counts: pd.DataFrame, groups: pd.Series) -> pd.DataFrame:
+    '''
+    Sufficient statistics of Fleiss' kappa per group: number of items, sum of the per-item agreement and votes per
+    category. They are additive, so items can be added to / removed from a group without looking at the others.
+
+    The agreement of an item uses its own number of votes n_i: (sum_j n_ij² - n_i) / (n_i (n_i - 1)). With the same
+    n for every item this is Fleiss' definition, as statsmodels' fleiss_kappa used by crowd_preprocessing.ipynb
+    (see check_kappa). After the approval-rate filter the HITs of a type usually have different numbers of votes:
+    statsmodels rejects such a table (the notebook then stored the error message as the kappa), this per-item
+    generalization still gives a value. Items with less than two votes have no agreement and are left out of the
+    group entirely, their votes included.
+
+    Args:
+        counts (pd.DataFrame): One row per item (HIT), one column per category (answer), number of votes.
+        groups (pd.Series): Group (HITTypeId) of every item, same index as counts.
+    '''
+    values = counts.to_numpy(dtype=np.float64)
+    raters = values.sum(axis=1)
+    # Items with less than two votes carry no agreement information
+    valid = raters >= 2
+    values, raters = values[valid], raters[valid]
+    statistics = pd.DataFrame(values, columns=list(counts.columns))
+    statistics.insert(0, 'agreement', ((values ** 2).sum(axis=1) - raters) / (raters * (raters - 1)))
+    statistics.insert(0, 'items', 1)
+    return statistics.groupby(groups.to_numpy()[valid]).sum()
+
+
+def fleiss_kappa(statistics: pd.DataFrame) -> pd.Series:
+    ''' Fleiss' kappa of every group from its kappa_statistics (per-item number of votes, see kappa_statistics) '''
+    categories = statistics.drop(columns=['items', 'agreement'])
+    p_category = categories.div(categories.sum(axis=1), axis=0)
+    p_expected = (p_category ** 2).sum(axis=1)
+    p_observed = statistics['agreement'] / statistics['items']
+    return (p_observed - p_expected) / (1 - p_expected)
+
+
+def check_kappa(counts: pd.DataFrame, groups: pd.Series) -> pd.DataFrame:
+    '''
+    Compare fleiss_kappa with statsmodels' (the computation of crowd_preprocessing.ipynb) on the HITs of every group
+    that have its most common number of votes, the only tables statsmodels accepts.
+
+    Args:
+        counts (pd.DataFrame): Votes per answer of every HIT, as CrowdAggregator.counts.
+        groups (pd.Series): HITTypeId of every HIT, same index as counts.
+
+    Returns:
+        pd.DataFrame: per HITTypeId the number of HITs compared, their votes per HIT, kappa here and in statsmodels.
+    '''
+    from statsmodels.stats.inter_rater import fleiss_kappa as statsmodels_fleiss_kappa
+
+    raters = counts.sum(axis=1)
+    rows = []
+    for hit_type, hits in groups.groupby(groups).groups.items():
+        n_votes = raters.loc[hits].mode().max()
+        if n_votes < 2:
+            continue
+        equal = raters.loc[hits][raters.loc[hits] == n_votes].index
+        kappa = fleiss_kappa(kappa_statistics(counts.loc[equal], groups.loc[equal])).iloc[0]
+        reference = statsmodels_fleiss_kappa(counts.loc[equal].to_numpy(), method='fleiss')
+        rows.append((hit_type, len(equal), n_votes, kappa, reference))
+    return pd.DataFrame(rows, columns=['HITTypeId', 'HITs', 'votes', 'kappa', 'statsmodels_kappa']) \
+        .set_index('HITTypeId')
+
+
+class CrowdAggregator:
+    '''
+    Running aggregation of crowd_data.tsv like crowd_preprocessing.ipynb: votes per answer and majority vote per HIT,
+    Fleiss' kappa per HITTypeId with the per-HIT number of votes of kappa_statistics (the notebook's value when the
+    HITs of a type have the same number of votes). Chunks (or new batches) only update the HITs they contain, and the
+    state can be saved and loaded to merge new batches later without re-reading the old ones: the result is the
+    same as aggregating all the votes at once.
+    '''
+    STATE = ['min_approval_rate', 'counts', 'inputs', 'fixes', 'kappa_statistics', 'batches']
+
+    def __init__(self, min_approval_rate: float = MIN_APPROVAL_RATE):
+        self.min_approval_rate = min_approval_rate
+        self.counts = pd.DataFrame(columns=ANSWER_IDS, dtype=np.int64)  # HITId -> votes per answer
+        self.inputs = pd.DataFrame(columns=INPUT_COLUMNS)  # HITId -> inputs of the HIT
+        self.fixes = None  # (HITId, FixValue) -> votes
+        self.kappa_statistics = None  # HITTypeId -> kappa_statistics
+        self.batches = set()  # names of the merged batches
+        self.rows_read = 0
+        self.rows_kept = 0
+
+    def add_chunk(self, chunk: pd.DataFrame):
+        # Un HIT che riceve nuovi voti cambia il suo numero di voti: il suo contributo al kappa viene ricalcolato
+        self.rows_read += len(chunk)
+        # Filtra i worker malevoli (LifetimeApprovalRate è una stringa come '85%')
+        approval = pd.to_numeric(chunk['LifetimeApprovalRate'].astype(str).str.rstrip('%'), errors='coerce')
+        chunk = chunk[approval > self.min_approval_rate]
+        self.rows_kept += len(chunk)
+        if chunk.empty:
+            return
+
+        chunk = chunk.assign(
+            Input1ID=chunk['Input1ID'].str.replace('wd:', '', regex=False),
+            Input2ID=chunk['Input2ID'].str.replace('wdt:', '', regex=False),
+            Input3ID=chunk['Input3ID'].astype(str).str.replace('wd:', '', regex=False),
+        )
+        inputs = chunk.groupby('HITId')[INPUT_COLUMNS].first()
+        new_hits = inputs.index.difference(self.inputs.index)
+        self.inputs = pd.concat([self.inputs, inputs.loc[new_hits]]) if len(self.inputs) else inputs
+
+        # Aggiorna solo gli HIT presenti nel chunk: togli il loro vecchio contributo al kappa, aggiungi il nuovo
+        chunk_counts = chunk.groupby(['HITId', 'AnswerID']).size().unstack(fill_value=0)
+        chunk_counts = chunk_counts.reindex(columns=ANSWER_IDS, fill_value=0)
+        old_counts = self.counts.reindex(chunk_counts.index, fill_value=0)
+        new_counts = (old_counts + chunk_counts).astype(np.int64)
+        groups = self.inputs.loc[chunk_counts.index, 'HITTypeId']
+        delta = kappa_statistics(new_counts, groups).sub(kappa_statistics(old_counts, groups), fill_value=0)
+        self.kappa_statistics = delta if self.kappa_statistics is None else \
+            self.kappa_statistics.add(delta, fill_value=0)
+        self.counts = pd.concat([self.counts.drop(chunk_counts.index, errors='ignore'), new_counts])
+
+        if 'FixValue' in chunk.columns:
+            fixes = chunk.dropna(subset=['FixValue']).groupby(['HITId', 'FixValue']).size()
+            self.fixes = fixes if self.fixes is None else self.fixes.add(fixes, fill_value=0).astype(np.int64)
+
+    def result(self) -> pd.DataFrame:
+        if self.counts.empty:
+            return pd.DataFrame(columns=AGGREGATED_COLUMNS)
+        counts = self.counts.sort_index()
+        counts.index.name = 'HITId'
+        aggregated = counts.rename(columns={answer_id: f'CountAnswerID{answer_id}' for answer_id in ANSWER_IDS})
+
+        # Majority vote, 0 if the two most voted answers are tied
+        values = counts.to_numpy()
+        top_two = np.sort(values, axis=1)[:, -2:]
+        majority = np.asarray(ANSWER_IDS)[values.argmax(axis=1)]
+        aggregated.insert(0, 'MajorityAnswer', np.where(top_two[:, 0] == top_two[:, 1], 0, majority).astype(float))
+
+        aggregated = aggregated.join(self.inputs, how='left')
+        aggregated['Kappa'] = aggregated['HITTypeId'].map(fleiss_kappa(self.kappa_statistics))
+
+        # Valore corretto proposto dalla maggioranza dei worker (se presente)
+        if self.fixes is not None and len(self.fixes):
+            fixes = self.fixes.sort_values(ascending=False, kind='stable').reset_index()
+            aggregated['FixValue'] = fixes.drop_duplicates('HITId').set_index('HITId')['FixValue']
+        else:
+            aggregated['FixValue'] = None
+        return aggregated.reset_index()[AGGREGATED_COLUMNS]
+
+    def save(self, path: str = CROWD_STATE_PATH):
+        pd.to_pickle({name: getattr(self, name) for name in self.STATE}, path)
+
+    @classmethod
+    def load(cls, path: str = CROWD_STATE_PATH) -> 'CrowdAggregator':
+        aggregator = cls()
+        for name, value in pd.read_pickle(path).items():
+            setattr(aggregator, name, value)
+        return aggregator
+
+    def add_tsv(self, tsv_path: str, chunk_size: int = 100_000):
+        for chunk in pd.read_csv(tsv_path, sep='\t', chunksize=chunk_size, dtype={'Input3ID': str, 'FixValue': str}):
+            self.add_chunk(chunk)
+        self.batches.add(os.path.basename(tsv_path))
+
+
+def _write_csv(aggregated: pd.DataFrame, output_path: str):
+    # Scrive su un file temporaneo e poi lo sostituisce, così CrowdStore non legge mai un CSV a metà
+    aggregated.to_csv(output_path + '.tmp', index=False)
+    os.replace(output_path + '.tmp', output_path)
+
+
+def aggregate_crowd_data(tsv_path: str = CROWD_DATA_PATH, output_path: str = CROWD_AGGREGATED_PATH,
+                         chunk_size: int = 100_000, min_approval_rate: float = MIN_APPROVAL_RATE,
+                         state_path: str = CROWD_STATE_PATH) -> pd.DataFrame:
+    '''
+    Stream crowd_data.tsv in chunks and write the aggregated answers (one row per HIT) to output_path.
+    The running state is saved to state_path, so later batches can be merged with merge_crowd_batch.
+    '''
+    start = time.perf_counter()
+    aggregator = CrowdAggregator(min_approval_rate)
+    aggregator.add_tsv(tsv_path, chunk_size)
+    aggregated = aggregator.result()
+    _write_csv(aggregated, output_path)
+    if state_path:
+        aggregator.save(state_path)
+    print(f"Aggregated {aggregator.rows_kept}/{aggregator.rows_read} votes (approval rate > {min_approval_rate}%) "
+          f"into {len(aggregated)} HITs in {time.perf_counter() - start:.2f}s ({output_path})")
+    return aggregated
+
+
+def merge_crowd_batch(tsv_path: str, output_path: str = CROWD_AGGREGATED_PATH, state_path: str = CROWD_STATE_PATH,
+                      chunk_size: int = 100_000) -> pd.DataFrame:
+    '''
+    Merge a new batch of crowd votes into the saved state: only the HITs of the batch (and the kappa of their
+    HITTypeIds) are recomputed, with the same kappa definition as aggregate_crowd_data (see kappa_statistics).
+    A batch with an already merged file name is skipped.
+    '''
+    start = time.perf_counter()
+    aggregator = CrowdAggregator.load(state_path)
+    if os.path.basename(tsv_path) in aggregator.batches:
+        print(f"Batch {tsv_path} has already been merged, skipping it.")
+        return aggregator.result()
+    aggregator.add_tsv(tsv_path, chunk_size)
+    aggregated = aggregator.result()
+    _write_csv(aggregated, output_path)
+    aggregator.save(state_path)
+    print(f"Merged {aggregator.rows_kept}/{aggregator.rows_read} votes of {tsv_path}, {len(aggregated)} HITs in total, "
+          f"in {time.perf_counter() - start:.2f}s ({output_path})")
+    return aggregated
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Aggregate the crowd votes of crowd_data.tsv.')
+    parser.add_argument('--input', default=CROWD_DATA_PATH)
+    parser.add_argument('--merge', action='store_true',
+                        help='merge --input as a new batch into the saved state instead of aggregating from scratch')
+    parser.add_argument('--output', default=CROWD_AGGREGATED_PATH)
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    parser.add_argument('--min-approval-rate', type=float, default=MIN_APPROVAL_RATE)
+    parser.add_argument('--check-kappa', action='store_true',
+                        help='compare the kappa of the saved state with statsmodels (needs statsmodels)')
+    args = parser.parse_args()
+    if args.check_kappa:
+        state = CrowdAggregator.load(CROWD_STATE_PATH)
+        report = check_kappa(state.counts, state.inputs.loc[state.counts.index, 'HITTypeId'])
+        print(report.to_string())
+        if not np.allclose(report['kappa'], report['statsmodels_kappa']):
+            print("Kappa differs from statsmodels on HITs with equal numbers of votes")
+            sys.exit(1)
+    elif args.merge:
+        merge_crowd_batch(args.input, args.output, chunk_size=args.chunk_size)
+    else:
+        aggregate_crowd_data(args.input, args.output, args.chunk_size, args.min_approval_rate)
@@ -0,0 +1,10 @@
+ENTITY_EMBEDS_PATH = 'dataset/ddis-graph-embeddings/entity_embeds.npy'
+RELATION_EMBEDS_PATH = 'dataset/ddis-graph-embeddings/relation_embeds.npy'
+ENTITY_IDS_PATH = 'dataset/ddis-graph-embeddings/entity_ids.del'
+RELATION_IDS_PATH = 'dataset/ddis-graph-embeddings/relation_ids.del'
+
+
+def load_del_file(del_file_path):
+    # Carica il file .del e crea una lista di identificatori
+    with open(del_file_path, 'r', encoding='utf-8') as file:
+        return [line.strip().split('\t')[1] for line in file]
@@ -2,30 +2,31 @@ import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 import pandas as pd
 
+from embeddings.embedding_utils import ENTITY_EMBEDS_PATH, RELATION_EMBEDS_PATH, ENTITY_IDS_PATH, RELATION_IDS_PATH, \
+    load_del_file
+
 class EmbeddingResolver:
-    def __init__(self):
+    def __init__(self, entities_df: pd.DataFrame = None):
         # Definisce i percorsi ai file nella cartella `dataset`
-        entity_embed_path = 'dataset/ddis-graph-embeddings/entity_embeds.npy'
-        relation_embed_path = 'dataset/ddis-graph-embeddings/relation_embeds.npy'
-        entity_del_path = 'dataset/ddis-graph-embeddings/entity_ids.del'
-        relation_del_path = 'dataset/ddis-graph-embeddings/relation_ids.del'
+        entity_embed_path = ENTITY_EMBEDS_PATH
+        relation_embed_path = RELATION_EMBEDS_PATH
+        entity_del_path = ENTITY_IDS_PATH
+        relation_del_path = RELATION_IDS_PATH
         entities_clean_path = 'dataset/entities_clean.csv'
         
-        # Carica gli embeddings
-        self.entity_embeddings = np.load(entity_embed_path)
-        self.relation_embeddings = np.load(relation_embed_path)
+        # Carica gli embeddings (memory-mapped: le pagine sono condivise tra i processi del bot, vedi prefork.py)
+        self.entity_embeddings = np.load(entity_embed_path, mmap_mode='r')
+        self.relation_embeddings = np.load(relation_embed_path, mmap_mode='r')
 
         # Carica gli identificatori dal file .del per ottenere gli ID
         self.entity_ids = self._load_del_file(entity_del_path)
         self.relation_ids = self._load_del_file(relation_del_path)
 
-        # Carica il dataset con i label delle entità
-        self.entities_df = pd.read_csv(entities_clean_path)
+        # Carica il dataset con i label delle entità (o usa quello già letto e condiviso, vedi startup.py)
+        self.entities_df = pd.read_csv(entities_clean_path) if entities_df is None else entities_df
 
     def _load_del_file(self, del_file_path):
-        # Carica il file .del e crea una lista di identificatori
-        with open(del_file_path, 'r', encoding='utf-8') as file:
-            return [line.strip().split('\t')[1] for line in file]
+        return load_del_file(del_file_path)
 
     def find_most_plausible_responses(self, decomposed_output, top_n=3):
         # Estrai l'ID di entità e relazione dal risultato decomposizione
@@ -1,55 +1,226 @@
 import pandas as pd
 import numpy as np
+import functools
+import logging
 import os
 
+from recommender.recommender_utils import SIMILARITY_PATH, SPARSE_SIMILARITY_PATH, MMAP_SIMILARITY_PATH, \
+    RECOMMENDATION_CACHE_PATH, FILM_PATH, qids_path
+from embeddings.embedding_utils import ENTITY_EMBEDS_PATH, ENTITY_IDS_PATH, load_del_file
 
+log = logging.getLogger('bot.recommender')  # configured by src.bot.log.setup_logging
 
-class RecommendationSolver:
+# 'matrix': precomputed film x film similarity (see SIMILARITY_BACKENDS)
+# 'embeddings': similarity computed on the fly from the TransE entity embeddings
+# Default of RecommendationSolver, e.g. BOT_RECOMMENDATION_BACKEND=embeddings
+RECOMMENDATION_BACKEND = os.environ.get('BOT_RECOMMENDATION_BACKEND', 'matrix')
+# Matrix file of the 'matrix' backend (.npz top-k, .npy float32 or .parquet), None: the first one that exists
+SIMILARITY_MATRIX_PATH = os.environ.get('BOT_SIMILARITY_PATH')
+
+
+class DenseSimilarity:
     '''
-    This class is used to recommend movies based on the similarity matrix
+    Full film x film similarity matrix, loaded from the .parquet file as a pandas DataFrame
     '''
-    def __init__(self):
-        # We start loading the data from .parquet files
-        self.similarity_df = pd.read_parquet('dataset/similarity_matrix/similarity.parquet', engine='pyarrow')
-        #films
-        self.films_df = pd.read_csv('dataset/films_clean.csv')
-
-    def process_recommendation_direct(self, entities: dict):
-        # Ottieni gli ID degli entity
-        ids = [key.split('/')[-1] for key in entities.keys()]
+    def __init__(self, path: str = SIMILARITY_PATH):
+        self.similarity_df = pd.read_parquet(path, engine='pyarrow')
+        self.columns = self.similarity_df.columns
+        self.row_index = {qid: row for row, qid in enumerate(self.similarity_df.index)}
 
+    def scores(self, ids: list) -> np.ndarray:
         # Intersezione degli ID comuni
         common_ids = self.similarity_df.index.intersection(ids)
 
         # Calcola il punteggio totale sommando le righe corrispondenti agli IDs comuni
         if not common_ids.empty:
-            total_scores = self.similarity_df.loc[common_ids].sum(axis=0).to_numpy()
-        else:
-            total_scores = np.zeros(self.similarity_df.shape[1])
+            return self.similarity_df.loc[common_ids].sum(axis=0).to_numpy()
+        return np.zeros(self.similarity_df.shape[1])
+
+
+class SparseSimilarity:
+    '''
+    Top-k neighbours of every film (CSR arrays), built offline by recommender_utils.build_sparse_topk
+    '''
+    def __init__(self, path: str = SPARSE_SIMILARITY_PATH):
+        with np.load(path) as store:
+            self.indptr = store['indptr']
+            self.indices = store['indices']
+            self.data = store['data']
+            self.columns = store['col_qids']
+            self.row_index = {qid: row for row, qid in enumerate(store['row_qids'])}
+
+    def scores(self, ids: list) -> np.ndarray:
+        rows = [self.row_index[qid] for qid in ids if qid in self.row_index]
+        if not rows:
+            return np.zeros(len(self.columns), dtype=np.float32)
+        # Somma solo i vicini salvati delle righe richieste
+        indices = np.concatenate([self.indices[self.indptr[row]:self.indptr[row + 1]] for row in rows])
+        data = np.concatenate([self.data[self.indptr[row]:self.indptr[row + 1]] for row in rows])
+        return np.bincount(indices, weights=data, minlength=len(self.columns))
+
+
+class MmapSimilarity:
+    '''
+    Dense float32 similarity matrix memory-mapped from a raw .npy (see recommender_utils.build_mmap_float32).
+    Only the rows of the requested films are read from disk; no pandas index alignment.
+    '''
+    def __init__(self, path: str = MMAP_SIMILARITY_PATH):
+        self.matrix = np.load(path, mmap_mode='r')
+        with np.load(qids_path(path)) as qids:
+            self.columns = qids['col_qids']
+            self.row_index = {qid: row for row, qid in enumerate(qids['row_qids'])}
+
+    def scores(self, ids: list) -> np.ndarray:
+        rows = sorted({self.row_index[qid] for qid in ids if qid in self.row_index})
+        if not rows:
+            return np.zeros(self.matrix.shape[1], dtype=np.float32)
+        return self.matrix[rows].sum(axis=0, dtype=np.float64)
+
+
+class EmbeddingSimilarity:
+    '''
+    Film similarity derived on the fly from the TransE entity embeddings: cosine similarity between the seed
+    entities and a normalized film-only sub-index. New films only need an embedding, no O(n²) matrix rebuild.
+    '''
+    def __init__(self, films_path: str = FILM_PATH, embeddings_path: str = ENTITY_EMBEDS_PATH,
+                 ids_path: str = ENTITY_IDS_PATH, films_df: pd.DataFrame = None):
+        self.embeddings = np.load(embeddings_path, mmap_mode='r')
+        self.entity_index = {uri.split('/')[-1]: i for i, uri in enumerate(load_del_file(ids_path))}
+
+        films_df = pd.read_csv(films_path) if films_df is None else films_df
+        film_qids = films_df['ID'].str.split('/').str[-1]
+        film_qids = [qid for qid in dict.fromkeys(film_qids) if qid in self.entity_index]
+        self.columns = np.asarray(film_qids, dtype=str)
+        self.row_index = {qid: row for row, qid in enumerate(film_qids)}
+        self.film_vectors = self._normalize(self.embeddings[[self.entity_index[qid] for qid in film_qids]])
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def scores(self, ids: list) -> np.ndarray:
+        rows = sorted({self.entity_index[qid] for qid in ids if qid in self.entity_index})
+        if not rows:
+            return np.zeros(len(self.columns), dtype=np.float32)
+        # Somma delle similarità coseno con ogni film del seed
+        query = self._normalize(self.embeddings[rows]).sum(axis=0)
+        return self.film_vectors @ query
 
-        # Trova i primi 5 indici con i punteggi più alti usando argsort
-        top_indices = np.argsort(-total_scores)
 
-        # Mappa gli indici ai QIDs
+SIMILARITY_BACKENDS = {'.npz': SparseSimilarity, '.npy': MmapSimilarity, '.parquet': DenseSimilarity}
+
+
+class RecommendationSolver:
+    '''
+    This class is used to recommend movies based on the similarity matrix.
+    The format is picked from the file extension (see SIMILARITY_BACKENDS). By default the first existing file of
+    sparse top-k store, memory-mapped float32 matrix and dense .parquet matrix is used (see recommender_utils.py).
+    With backend='embeddings' the similarity is computed from the graph embeddings instead (EmbeddingSimilarity).
+    Single-film seeds are answered from the precomputed cache (recommendation_cache.npz) when it exists,
+    other seed combinations are kept in an LRU cache.
+    '''
+    def __init__(self, similarity_path: str = None, cache_path: str = RECOMMENDATION_CACHE_PATH,
+                 lru_size: int = 1024, backend: str = None, films_df: pd.DataFrame = None):
+        # films_df: films_clean.csv already read by the caller (shared, not modified)
+        backend = backend or RECOMMENDATION_BACKEND
+        similarity_path = similarity_path or SIMILARITY_MATRIX_PATH
+        films_df = pd.read_csv(FILM_PATH) if films_df is None else films_df
+        if backend == 'embeddings':
+            self.similarity = EmbeddingSimilarity(films_df=films_df)
+            similarity_path = ENTITY_EMBEDS_PATH
+        elif backend == 'matrix':
+            if similarity_path is None:
+                similarity_path = next((path for path in (SPARSE_SIMILARITY_PATH, MMAP_SIMILARITY_PATH)
+                                        if os.path.exists(path)), SIMILARITY_PATH)
+            self.similarity = SIMILARITY_BACKENDS[os.path.splitext(similarity_path)[1]](similarity_path)
+        else:
+            raise ValueError(f"Unknown recommendation backend '{backend}', expected 'matrix' or 'embeddings'.")
+        # Backend and file the scores come from: the single-seed cache is only used if built from the same ones
+        self.backend = backend
+        self.similarity_path = similarity_path
+        #films
+        self.films_df = films_df
+
+        # Precomputed per-column arrays: full ID and label of every column of the similarity matrix
         base_url = 'http://www.wikidata.org/entity/'
-        top_qids = [base_url + self.similarity_df.columns[i] for i in top_indices]
+        label_by_qid = dict(zip(self.films_df['ID'].str.split('/').str[-1], self.films_df['Label']))
+        columns = [str(qid) for qid in self.similarity.columns]
+        self.column_index = {qid: i for i, qid in enumerate(columns)}
+        self.column_ids = np.array([base_url + qid for qid in columns], dtype=object)
+        self.column_labels = np.array([label_by_qid.get(qid) for qid in columns], dtype=object)
+        # Columns without a label can't be shown, they are never recommended
+        self.unlabeled_columns = np.flatnonzero(pd.isna(self.column_labels))
 
-        # Rimuovi le entità già presenti in result['entities']
-        excluded_ids = set(entities.keys())  # Entità da escludere
-        filtered_qids = [qid for qid in top_qids if qid not in excluded_ids]
+        # Cache of precomputed recommendations for single-film seeds: {QID: row of self.cached_top_columns}
+        self.single_seed_cache = {}
+        self.cached_top_columns = np.empty((0, 0), dtype=np.int32)
+        if cache_path and os.path.exists(cache_path):
+            self._load_single_seed_cache(cache_path)
+        self._top_columns_lru = functools.lru_cache(maxsize=lru_size)(self._top_columns)
 
-        # Seleziona i primi 5 risultati dopo l'esclusione
-        filtered_qids = filtered_qids[:5]
+    def _cache_source(self) -> dict:
+        # Identità della sorgente dei punteggi, salvata nella cache e confrontata al caricamento
+        return {'backend': self.backend, 'source_path': os.path.normpath(self.similarity_path),
+                'source_mtime': os.path.getmtime(self.similarity_path)}
 
-        # Trova le Label corrispondenti
-        top_films = self.films_df[self.films_df['ID'].isin(filtered_qids)]
+    def _load_single_seed_cache(self, cache_path: str):
+        with np.load(cache_path) as cache:
+            source = self._cache_source()
+            stored = {key: cache[key].item() if key in cache else None for key in source}
+            if stored != source:
+                log.warning("Recommendation cache %s was built from %s, the solver uses %s: ignoring it",
+                            cache_path, stored, source)
+                return
+            if not np.array_equal(cache['col_qids'], np.asarray(self.similarity.columns, dtype=str)):
+                log.warning("Recommendation cache %s was built for other films, ignoring it", cache_path)
+                return
+            self.cached_top_columns = cache['top_columns']
+            self.single_seed_cache = {qid: row for row, qid in enumerate(cache['seed_qids'])}
+
+    def _top_columns(self, seeds: frozenset, top_n: int) -> np.ndarray:
+        # Calcola il punteggio totale sommando le righe corrispondenti agli IDs comuni
+        total_scores = np.array(self.similarity.scores(list(seeds)), dtype=np.float64)
 
-        # Crea un dizionario con ID e Label
-        top_dict = dict(zip(top_films['ID'], top_films['Label']))
+        # Escludi le entità già presenti (e i film senza label) prima della selezione
+        excluded_columns = [self.column_index[qid] for qid in seeds if qid in self.column_index]
+        total_scores[excluded_columns] = -np.inf
+        total_scores[self.unlabeled_columns] = -np.inf
 
-        return top_dict
+        # Seleziona i top_n indici con argpartition, poi ordinali per punteggio
+        top_n = min(top_n, len(total_scores))
+        if top_n <= 0:
+            return np.empty(0, dtype=np.int32)
+        top_indices = np.argpartition(-total_scores, top_n - 1)[:top_n]
+        top_indices = top_indices[np.argsort(-total_scores[top_indices], kind='stable')]
+        top_indices = top_indices[np.isfinite(total_scores[top_indices])].astype(np.int32)
+        top_indices.flags.writeable = False  # shared through the LRU cache
+        return top_indices
+
+    def process_recommendation_direct(self, entities: dict, top_n: int = 5):
+        # Ottieni gli ID degli entity
+        seeds = frozenset(key.split('/')[-1] for key in entities.keys())
+
+        cached_row = self.single_seed_cache.get(next(iter(seeds))) if len(seeds) == 1 else None
+        if cached_row is not None and top_n <= self.cached_top_columns.shape[1]:
+            top_indices = self.cached_top_columns[cached_row, :top_n]
+            top_indices = top_indices[top_indices >= 0]  # -1 = padding
+        else:
+            top_indices = self._top_columns_lru(seeds, top_n)
 
-    # Esempio di uso della funzione
-    #top_films = process_recommendation_direct(result['entities'], matrices, films_df)
-    #print(top_films)
+        # Dizionario ordinato {ID: Label}
+        return dict(zip(self.column_ids[top_indices], self.column_labels[top_indices]))
 
+    def build_single_seed_cache(self, output_path: str = RECOMMENDATION_CACHE_PATH, top_n: int = 20) -> str:
+        '''
+        Offline job: store the top_n recommendations of every film of the similarity matrix used as a single seed
+        '''
+        seed_qids = [str(qid) for qid in self.similarity.row_index]
+        top_columns = np.full((len(seed_qids), top_n), -1, dtype=np.int32)
+        for row, qid in enumerate(seed_qids):
+            top_indices = self._top_columns(frozenset([qid]), top_n)
+            top_columns[row, :len(top_indices)] = top_indices
+        np.savez(output_path, seed_qids=np.asarray(seed_qids, dtype=str), top_columns=top_columns,
+                 col_qids=np.asarray(self.similarity.columns, dtype=str), **self._cache_source())
+        return output_path
@@ -0,0 +1,125 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+FILM_PATH = 'dataset/films_clean.csv'
+SIMILARITY_PATH = 'dataset/similarity_matrix/similarity.parquet'
+SPARSE_SIMILARITY_PATH = 'dataset/similarity_matrix/similarity_topk.npz'
+MMAP_SIMILARITY_PATH = 'dataset/similarity_matrix/similarity_f32.npy'
+RECOMMENDATION_CACHE_PATH = 'dataset/similarity_matrix/recommendation_cache.npz'
+
+
+def qids_path(matrix_path: str) -> str:
+    ''' Side file with the row / column QIDs of a raw .npy similarity matrix '''
+    return os.path.splitext(matrix_path)[0] + '_qids.npz'
+
+
+def build_sparse_topk(parquet_path: str = SIMILARITY_PATH, output_path: str = SPARSE_SIMILARITY_PATH,
+                      k: int = 100, chunk_size: int = 1024) -> str:
+    '''
+    Offline job: keep only the k most similar films of every row of the dense film x film similarity matrix and
+    store them as CSR arrays (indptr, indices, data) in an uncompressed .npz, together with the row / column QIDs.
+    '''
+    start = time.perf_counter()
+    similarity_df = pd.read_parquet(parquet_path, engine='pyarrow')
+    load_time = time.perf_counter() - start
+
+    n_rows, n_cols = similarity_df.shape
+    k = min(k, n_cols)
+    indices = np.empty((n_rows, k), dtype=np.int32)
+    data = np.empty((n_rows, k), dtype=np.float32)
+
+    # Process the rows in chunks so only chunk_size x n_cols values are converted at a time
+    for chunk_start in range(0, n_rows, chunk_size):
+        values = similarity_df.iloc[chunk_start:chunk_start + chunk_size].to_numpy(dtype=np.float32)
+        values = np.nan_to_num(values, nan=0.0)
+        top = np.argpartition(-values, k - 1, axis=1)[:, :k]
+        top_values = np.take_along_axis(values, top, axis=1)
+        # Sort the k neighbours of every row by decreasing similarity
+        order = np.argsort(-top_values, axis=1)
+        indices[chunk_start:chunk_start + len(values)] = np.take_along_axis(top, order, axis=1)
+        data[chunk_start:chunk_start + len(values)] = np.take_along_axis(top_values, order, axis=1)
+
+    np.savez(
+        output_path,
+        indptr=np.arange(0, n_rows * k + 1, k, dtype=np.int64),
+        indices=indices.ravel(),
+        data=data.ravel(),
+        row_qids=similarity_df.index.to_numpy(dtype=str),
+        col_qids=similarity_df.columns.to_numpy(dtype=str),
+    )
+
+    dense_mb = similarity_df.memory_usage(deep=False).sum() / 1e6
+    sparse_mb = os.path.getsize(output_path) / 1e6
+    print(f"Converted {n_rows} x {n_cols} similarity matrix to top-{k} neighbours in "
+          f"{time.perf_counter() - start:.1f}s (parquet load {load_time:.1f}s): "
+          f"{dense_mb:.1f} MB dense in memory -> {sparse_mb:.1f} MB sparse ({output_path})")
+    return output_path
+
+
+def build_mmap_float32(parquet_path: str = SIMILARITY_PATH, output_path: str = MMAP_SIMILARITY_PATH,
+                       chunk_size: int = 1024) -> str:
+    '''
+    Offline job: export the dense similarity matrix as a raw float32 .npy (loadable with mmap_mode='r', so it loads
+    instantly and its pages are shared between processes) plus a small side file with the row / column QIDs.
+    '''
+    start = time.perf_counter()
+    similarity_df = pd.read_parquet(parquet_path, engine='pyarrow')
+    n_rows, n_cols = similarity_df.shape
+
+    matrix = np.lib.format.open_memmap(output_path, mode='w+', dtype=np.float32, shape=(n_rows, n_cols))
+    for chunk_start in range(0, n_rows, chunk_size):
+        values = similarity_df.iloc[chunk_start:chunk_start + chunk_size].to_numpy(dtype=np.float32)
+        matrix[chunk_start:chunk_start + len(values)] = np.nan_to_num(values, nan=0.0)
+    matrix.flush()
+    del matrix
+
+    np.savez(qids_path(output_path),
+             row_qids=similarity_df.index.to_numpy(dtype=str),
+             col_qids=similarity_df.columns.to_numpy(dtype=str))
+
+    dense_mb = similarity_df.memory_usage(deep=False).sum() / 1e6
+    print(f"Exported {n_rows} x {n_cols} similarity matrix in {time.perf_counter() - start:.1f}s: "
+          f"{dense_mb:.1f} MB float64 pandas -> {os.path.getsize(output_path) / 1e6:.1f} MB float32 ({output_path})")
+    return output_path
+
+
+def build_recommendation_cache(similarity_path: str = None, output_path: str = RECOMMENDATION_CACHE_PATH,
+                               top_n: int = 20, backend: str = 'matrix') -> str:
+    '''
+    Offline job: precompute the top_n recommendations of every single-film seed (see RecommendationSolver)
+    '''
+    from recommender.recommender import RecommendationSolver
+
+    start = time.perf_counter()
+    solver = RecommendationSolver(similarity_path, cache_path=None, backend=backend)
+    solver.build_single_seed_cache(output_path, top_n=top_n)
+    print(f"Precomputed top-{top_n} recommendations for {len(solver.similarity.row_index)} films in "
+          f"{time.perf_counter() - start:.1f}s ({output_path})")
+    return output_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert the dense similarity matrix into a faster format.')
+    parser.add_argument('--format', choices=['sparse', 'mmap', 'cache'], default='sparse',
+                        help='sparse: top-k neighbours (.npz), mmap: raw float32 matrix (.npy), '
+                             'cache: precomputed recommendations of every single-film seed (.npz)')
+    parser.add_argument('--input', help=f'similarity matrix to read (default {SIMILARITY_PATH}; for cache: any format '
+                                        f'RecommendationSolver can load, default the one it picks at runtime)')
+    parser.add_argument('--backend', choices=['matrix', 'embeddings'], default='matrix',
+                        help='cache: similarity the recommendations are computed with, as RecommendationSolver')
+    parser.add_argument('--output', help='defaults to the path RecommendationSolver looks for')
+    parser.add_argument('-k', type=int, default=100, help='neighbours kept per film (sparse) / '
+                                                          'recommendations stored per seed (cache)')
+    parser.add_argument('--chunk-size', type=int, default=1024)
+    args = parser.parse_args()
+    if args.format == 'sparse':
+        build_sparse_topk(args.input or SIMILARITY_PATH, args.output or SPARSE_SIMILARITY_PATH, k=args.k, chunk_size=args.chunk_size)
+    elif args.format == 'mmap':
+        build_mmap_float32(args.input or SIMILARITY_PATH, args.output or MMAP_SIMILARITY_PATH, chunk_size=args.chunk_size)
+    else:
+        build_recommendation_cache(args.input, args.output or RECOMMENDATION_CACHE_PATH, top_n=args.k,
+                                   backend=args.backend)
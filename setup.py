@@ -1,5 +1,7 @@
 from src.bot.speakeasy_bot import Agent
+from src.bot.log import setup_logging
 
 if __name__ == '__main__':
+    setup_logging()
     demo_bot = Agent("calm-breeze", "R0ltF9V6")
     demo_bot.listen()
\ No newline at end of file
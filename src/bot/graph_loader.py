@@ -0,0 +1,218 @@
+import argparse
+import mmap
+import os
+import re
+import sys
+import time
+
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from src.bot.graph_tables import GRAPH_PATH, RDFS_LABEL, SCHEMA_DESCRIPTION, unescape_literal
+from src.bot.log import get_logger, setup_logging
+
+log = get_logger('graph')
+
+PRUNED_GRAPH_PATH = 'dataset/14_graph_pruned.nt'
+RELATIONS_PATH = 'dataset/relations.csv'
+# Oltre alle relazioni di relations.csv: label, descrizioni e tipi
+KEEP_PREDICATES = [
+    RDFS_LABEL,
+    SCHEMA_DESCRIPTION,
+    'http://www.w3.org/1999/02/22-rdf-syntax-ns#type',
+    'http://www.wikidata.org/prop/direct/P31',  # instance of
+    'http://www.wikidata.org/prop/direct/P279',  # subclass of
+]
+
+# <subject> <predicate> <object> . -- terms are kept as their N-Triples text, e.g. <http://...>, _:b0, "x"@en
+TRIPLE = re.compile(r'\s*(<[^>]*>|_:\S+)\s+(<[^>]*>)\s+(<[^>]*>|_:\S+|"(?:[^"\\]|\\.)*"(?:@[\w-]+|\^\^<[^>]*>)?)'
+                    r'\s*\.\s*$')
+LITERAL = re.compile(r'"((?:[^"\\]|\\.)*)"(?:@([\w-]+)|\^\^<([^>]*)>)?$')
+
+
+class EncodedGraph:
+    '''
+    Integer-encoded triples: triples[i] = (subject, predicate, object) ids into terms (N-Triples text of every term).
+    malformed: lines of the source file the loader could not parse, their triples are missing
+    '''
+    def __init__(self, terms: list, triples: np.ndarray, malformed: int = 0):
+        self.terms = terms
+        self.triples = triples
+        self.malformed = malformed
+
+    def __len__(self):
+        return len(self.triples)
+
+    def save(self, path: str):
+        np.savez(path, terms=np.asarray(self.terms, dtype=str), triples=self.triples)
+
+    @classmethod
+    def load(cls, path: str) -> 'EncodedGraph':
+        with np.load(path) as data:
+            return cls(data['terms'].tolist(), data['triples'])
+
+    def prune(self, predicates) -> 'EncodedGraph':
+        ''' Keep only the triples whose predicate IRI is in predicates, and only the terms they use '''
+        predicate_terms = {f'<{predicate}>' for predicate in predicates}
+        predicate_ids = [term_id for term_id, term in enumerate(self.terms) if term in predicate_terms]
+        triples = self.triples[np.isin(self.triples[:, 1], predicate_ids)]
+        used, triples = np.unique(triples, return_inverse=True)
+        return EncodedGraph([self.terms[term_id] for term_id in used.tolist()],
+                            triples.reshape(-1, 3).astype(np.int32))
+
+    def write_nt(self, path: str):
+        with open(path, 'w', encoding='utf-8') as file:
+            for s, p, o in self.triples.tolist():
+                file.write(f'{self.terms[s]} {self.terms[p]} {self.terms[o]} .\n')
+
+    def to_rdflib(self, graph=None):
+        ''' Fill an rdflib Graph; every distinct term is converted to an rdflib node only once '''
+        import rdflib
+
+        graph = rdflib.Graph() if graph is None else graph
+        nodes = [_to_node(term) for term in self.terms]
+        graph.addN((nodes[s], nodes[p], nodes[o], graph) for s, p, o in self.triples.tolist())
+        return graph
+
+
+def _to_node(term: str):
+    import rdflib
+
+    if term[0] == '<':
+        return rdflib.URIRef(term[1:-1])
+    if term[0] == '_':
+        return rdflib.BNode(term[2:])
+    lexical, language, datatype = LITERAL.match(term).groups()
+    return rdflib.Literal(unescape_literal(lexical), lang=language,
+                          datatype=rdflib.URIRef(datatype) if datatype else None)
+
+
+def _chunk_bounds(path: str, n_chunks: int) -> list:
+    # Divide il file in n_chunks parti, spostando ogni confine dopo il successivo '\n'
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        bounds = [0]
+        for i in range(1, n_chunks):
+            newline = data.find(b'\n', max(size * i // n_chunks, bounds[-1]))
+            if newline == -1:
+                break
+            if newline + 1 > bounds[-1]:
+                bounds.append(newline + 1)
+        if bounds[-1] != size:
+            bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _parse_chunk(args) -> tuple:
+    path, start, end = args
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        text = data[start:end].decode('utf-8')
+
+    term_ids = {}
+    ids = []
+    malformed = 0
+    for line in text.splitlines():
+        if not line or line.lstrip()[:1] in ('', '#'):
+            continue
+        match = TRIPLE.match(line)
+        if match is None:
+            malformed += 1
+            continue
+        for term in match.groups():
+            term_id = term_ids.get(term)
+            if term_id is None:
+                term_id = term_ids[term] = len(term_ids)
+            ids.append(term_id)
+    return list(term_ids), np.array(ids, dtype=np.int32).reshape(-1, 3), malformed
+
+
+def load_triples(path: str = GRAPH_PATH, workers: int = None, chunks_per_worker: int = 4,
+                 context: str = None) -> EncodedGraph:
+    '''
+    Parse an N-Triples file in parallel: the memory-mapped file is split at line boundaries, every chunk is parsed
+    in a process pool into local term ids and the chunks are merged into one EncodedGraph.
+    context: multiprocessing start method of the pool ('forkserver' when other threads are running, see startup.py),
+    default: the platform's. Progress is logged per chunk at DEBUG, the totals at INFO.
+    '''
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    bounds = _chunk_bounds(path, workers * chunks_per_worker)
+
+    term_ids = {}
+    parts = []
+    malformed = 0
+    pool_context = get_context(context)
+    if pool_context.get_start_method() == 'forkserver':
+        pool_context.set_forkserver_preload([__name__])  # the workers fork from a server that already imported us
+    with pool_context.Pool(workers) as pool:
+        results = pool.imap(_parse_chunk, [(path, chunk_start, chunk_end) for chunk_start, chunk_end in bounds])
+        for i, (local_terms, local_triples, local_malformed) in enumerate(results, 1):
+            # Rimappa gli id locali del chunk sugli id globali
+            mapping = np.array([term_ids.setdefault(term, len(term_ids)) for term in local_terms], dtype=np.int32)
+            parts.append(mapping[local_triples] if len(local_triples) else local_triples)
+            malformed += local_malformed
+            log.debug("Parsed chunk %s/%s (%.1fs)", i, len(bounds), time.perf_counter() - start)
+
+    triples = np.concatenate(parts) if parts else np.empty((0, 3), dtype=np.int32)
+    log.info("Loaded %s triples, %s terms from %s with %s workers in %.1fs", len(triples), len(term_ids), path,
+             workers, time.perf_counter() - start)
+    if malformed:
+        log.warning("%s malformed lines of %s skipped", malformed, path)
+    return EncodedGraph(list(term_ids), triples, malformed)
+
+
+def _measure_rdflib_load(path: str) -> tuple:
+    # Eseguito in un processo separato: tempo di caricamento e picco di memoria (MB) del grafo rdflib
+    import rdflib
+    import resource
+
+    start = time.perf_counter()
+    graph = rdflib.Graph()
+    graph.parse(path, format='turtle')
+    seconds = time.perf_counter() - start
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return seconds, max_rss / (1e6 if sys.platform == 'darwin' else 1e3), len(graph)
+
+
+def prune_graph(path: str = GRAPH_PATH, output_path: str = PRUNED_GRAPH_PATH, relations_path: str = RELATIONS_PATH,
+                workers: int = None, measure: bool = False) -> str:
+    '''
+    Offline job: keep only the triples the bot can ask for, i.e. whose predicate is in relations.csv or in
+    KEEP_PREDICATES, and write them as N-Triples (SPARQLQuerySolver loads this file when it exists).
+    With measure=True both graphs are loaded with rdflib (one process each) to compare load time and memory.
+    '''
+    predicates = set(pd.read_csv(relations_path)['ID']) | set(KEEP_PREDICATES)
+    encoded = load_triples(path, workers)
+    pruned = encoded.prune(predicates)
+    pruned.write_nt(output_path)
+    print(f"Kept {len(pruned)}/{len(encoded)} triples ({len(pruned) / max(len(encoded), 1):.1%}), "
+          f"{os.path.getsize(output_path) / 1e6:.1f} MB / {os.path.getsize(path) / 1e6:.1f} MB ({output_path})")
+
+    if measure:
+        for name, graph_path in (('full', path), ('pruned', output_path)):
+            with get_context('spawn').Pool(1) as pool:
+                seconds, max_rss, n_triples = pool.apply(_measure_rdflib_load, (graph_path,))
+            print(f"rdflib load of the {name} graph: {n_triples} triples in {seconds:.1f}s, peak RSS {max_rss:.0f} MB")
+    return output_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parse the N-Triples graph in parallel into integer-encoded arrays.')
+    parser.add_argument('--input', default=GRAPH_PATH)
+    parser.add_argument('--workers', type=int, default=None, help='defaults to the number of cores')
+    parser.add_argument('--output', help='save the encoded graph to this .npz (with --prune: the pruned .nt)')
+    parser.add_argument('--prune', action='store_true',
+                        help='write the subgraph of the relations in relations.csv plus labels, descriptions, types')
+    parser.add_argument('--measure', action='store_true', help='with --prune: compare rdflib load time and memory')
+    args = parser.parse_args()
+    setup_logging('DEBUG', structured=False)  # progress of load_triples
+    if args.prune:
+        prune_graph(args.input, args.output or PRUNED_GRAPH_PATH, workers=args.workers, measure=args.measure)
+    else:
+        encoded = load_triples(args.input, args.workers)
+        if args.output:
+            encoded.save(args.output)
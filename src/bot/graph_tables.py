@@ -0,0 +1,121 @@
+import argparse
+import os
+import re
+import time
+
+import numpy as np
+
+GRAPH_PATH = 'dataset/14_graph.nt'
+GRAPH_TABLES_DIR = 'dataset/graph_tables'
+WD = 'http://www.wikidata.org/entity/'
+RDFS_LABEL = 'http://www.w3.org/2000/01/rdf-schema#label'
+SCHEMA_DESCRIPTION = 'http://schema.org/description'
+
+# <subject> <predicate> "literal"[@lang | ^^<datatype>] .
+LITERAL_TRIPLE = re.compile(r'<([^>]*)>\s+<([^>]*)>\s+"((?:[^"\\]|\\.)*)"(?:@([\w-]+)|\^\^<[^>]*>)?\s*\.\s*$')
+ESCAPE = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+ECHARS = {'t': '\t', 'b': '\b', 'n': '\n', 'r': '\r', 'f': '\f', '"': '"', "'": "'", '\\': '\\'}
+
+
+def unescape_literal(literal: str) -> str:
+    def replace(match):
+        code = match.group(1) or match.group(2)
+        return chr(int(code, 16)) if code else ECHARS.get(match.group(3), match.group(3))
+    return ESCAPE.sub(replace, literal) if '\\' in literal else literal
+
+
+def _qid_number(entity_id: str):
+    # 'http://www.wikidata.org/entity/Q123' o 'Q123' -> 123, None se non è un'entità Wikidata
+    qid = entity_id.rsplit('/', 1)[-1]
+    return int(qid[1:]) if qid[:1] == 'Q' and qid[1:].isdigit() else None
+
+
+class EntityTable:
+    '''
+    Read-only QID -> string table, memory-mapped from three .npy files: sorted QID numbers, offsets and a UTF-8 blob.
+    Built offline by build_graph_tables, so lookups never touch the rdflib graph.
+    '''
+    def __init__(self, path_prefix: str):
+        self.keys = np.load(path_prefix + '_keys.npy', mmap_mode='r')
+        self.offsets = np.load(path_prefix + '_offsets.npy', mmap_mode='r')
+        self.blob = np.load(path_prefix + '_blob.npy', mmap_mode='r')
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, entity_id: str, default=None):
+        number = _qid_number(entity_id)
+        if number is None:
+            return default
+        i = int(np.searchsorted(self.keys, number))
+        if i == len(self.keys) or self.keys[i] != number:
+            return default
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def __contains__(self, entity_id: str):
+        return self.get(entity_id) is not None
+
+    @staticmethod
+    def save(values: dict, path_prefix: str):
+        ''' values: {QID number: string} '''
+        keys = np.array(sorted(values), dtype=np.int64)
+        encoded = [values[key].encode('utf-8') for key in keys.tolist()]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        np.save(path_prefix + '_keys.npy', keys)
+        np.save(path_prefix + '_offsets.npy', offsets)
+        np.save(path_prefix + '_blob.npy', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+
+class GraphTables:
+    '''
+    QID -> label and QID -> description tables of the knowledge graph (see build_graph_tables)
+    '''
+    def __init__(self, tables_dir: str = GRAPH_TABLES_DIR):
+        self.labels = EntityTable(os.path.join(tables_dir, 'labels'))
+        self.descriptions = EntityTable(os.path.join(tables_dir, 'descriptions'))
+
+
+def load_graph_tables(tables_dir: str = GRAPH_TABLES_DIR):
+    ''' GraphTables if they have been built, otherwise None (lookups fall back to SPARQL queries) '''
+    if not os.path.exists(os.path.join(tables_dir, 'descriptions_blob.npy')):
+        return None
+    return GraphTables(tables_dir)
+
+
+def build_graph_tables(nt_path: str = GRAPH_PATH, output_dir: str = GRAPH_TABLES_DIR) -> str:
+    '''
+    Offline job: stream the N-Triples file once and store the English (or untagged) rdfs:label and
+    schema:description of every Wikidata entity. The first value found for an entity is kept.
+    '''
+    start = time.perf_counter()
+    tables = {RDFS_LABEL: {}, SCHEMA_DESCRIPTION: {}}
+    with open(nt_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if RDFS_LABEL not in line and SCHEMA_DESCRIPTION not in line:
+                continue
+            match = LITERAL_TRIPLE.match(line)
+            if match is None:
+                continue
+            subject, predicate, literal, language = match.groups()
+            table = tables.get(predicate)
+            if table is None or language not in (None, 'en') or not subject.startswith(WD):
+                continue
+            number = _qid_number(subject)
+            if number is not None and number not in table:
+                table[number] = unescape_literal(literal)
+
+    os.makedirs(output_dir, exist_ok=True)
+    EntityTable.save(tables[RDFS_LABEL], os.path.join(output_dir, 'labels'))
+    EntityTable.save(tables[SCHEMA_DESCRIPTION], os.path.join(output_dir, 'descriptions'))
+    print(f"Extracted {len(tables[RDFS_LABEL])} labels and {len(tables[SCHEMA_DESCRIPTION])} descriptions "
+          f"from {nt_path} in {time.perf_counter() - start:.1f}s ({output_dir})")
+    return output_dir
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the QID -> label / description tables of the graph.')
+    parser.add_argument('--input', default=GRAPH_PATH)
+    parser.add_argument('--output', default=GRAPH_TABLES_DIR)
+    args = parser.parse_args()
+    build_graph_tables(args.input, args.output)
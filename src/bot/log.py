@@ -0,0 +1,146 @@
+import atexit
+import contextlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+# Level of the bot loggers, e.g. BOT_LOG_LEVEL=DEBUG to see the decomposition of every question
+LOG_LEVEL = os.environ.get('BOT_LOG_LEVEL', 'INFO')
+
+_listener = None  # QueueListener started by the last setup_logging call
+_exception_formatter = logging.Formatter()  # tracebacks rendered on the caller thread by DeferredQueueHandler
+
+
+class StructuredFormatter(logging.Formatter):
+    '''
+    One JSON object per record: time, level, logger, message and the `fields` passed with extra={'fields': {...}}
+    '''
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:  # already rendered by DeferredQueueHandler
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    '''
+    Render the message (and the traceback) on the caller thread, before the arguments can change, e.g. a dict
+    updated right after the log call; the JSON encoding and the write are left to the listener thread.
+    Only records that passed the level check get here.
+    '''
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def get_logger(name: str) -> logging.Logger:
+    ''' Logger under the 'bot' hierarchy, configured by setup_logging '''
+    return logging.getLogger('bot.' + name)
+
+
+def stop_logging():
+    ''' Stop the listener thread after it has written every queued record '''
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(level: str = LOG_LEVEL, stream=None, structured: bool = True):
+    '''
+    Route the 'bot' loggers through a QueueHandler: the request path renders the message and enqueues the record,
+    encoding and writing happen in a QueueListener thread. Records below `level` are dropped before any formatting
+    (the messages use lazy %-style arguments).
+
+    Returns:
+        logging.handlers.QueueListener: already started, stopped at exit or by the next setup_logging call.
+    '''
+    global _listener
+    stop_logging()
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(StructuredFormatter() if structured else
+                         logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+
+    logger = logging.getLogger('bot')
+    for old_handler in list(logger.handlers):
+        logger.removeHandler(old_handler)
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    logger.setLevel(level)
+    logger.propagate = False
+
+    listener.start()
+    _listener = listener
+    return listener
+
+
+def setup_worker_logging(log_queue):
+    '''
+    In a process forked from the bot (prefork.WorkerPool): send the 'bot' records to the master through a
+    multiprocessing queue, and only there: the inherited handlers are dropped and the records don't propagate to
+    the root handlers copied from the master. The standard QueueHandler formats the message before enqueuing it,
+    so the record can be pickled.
+    '''
+    global _listener
+    _listener = None
+    logger = logging.getLogger('bot')
+    for old_handler in list(logger.handlers):
+        logger.removeHandler(old_handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.propagate = False
+
+
+@contextlib.contextmanager
+def listener_paused():
+    '''
+    Stop the listener thread (after it has written the queued records) and restart it on exit, around a fork: a
+    child forked while the thread runs could inherit a lock it holds. Records logged meanwhile stay in the queue.
+    '''
+    global _listener
+    listener = _listener
+    stop_logging()
+    try:
+        yield
+    finally:
+        if listener is not None:
+            _listener = logging.handlers.QueueListener(listener.queue, *listener.handlers,
+                                                       respect_handler_level=listener.respect_handler_level)
+            _listener.start()
+
+
+class _RelayHandler(logging.Handler):
+    ''' Hand a record of a worker to the master's logger of the same name, as if it had been logged there '''
+    def emit(self, record: logging.LogRecord):
+        logging.getLogger(record.name).handle(record)
+
+
+def forward_worker_logs(log_queue) -> logging.handlers.QueueListener:
+    '''
+    In the master: log the records of the workers (setup_worker_logging) through the master's own loggers, so they
+    end up wherever its records do: the setup_logging listener, the root handlers, or logging's last resort
+    handler (warnings and errors on stderr) when nothing is configured.
+    '''
+    listener = logging.handlers.QueueListener(log_queue, _RelayHandler())
+    listener.start()
+    return listener
+
+
+atexit.register(stop_logging)
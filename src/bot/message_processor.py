@@ -8,7 +8,32 @@ import os
 import random
 import copy
 
+from crowdsourcing.crowdsourcing_handler import CrowdStore
+from src.bot.tracing import tracer
+from src.bot.log import get_logger
+
+log = get_logger('message_processor')
+
 FILM_PATH = 'dataset/films_clean.csv'
+FILM_DOUBLE_PATH = 'dataset/film_double.csv'
+HUMANS_PATH = 'dataset/humans_clean.csv'
+ENTITIES_PATH = 'dataset/entities_clean.csv'
+RELATIONS_PATH = 'dataset/relations.csv'
+
+
+def read_frame(path: str, frames: dict = None) -> pd.DataFrame:
+    # frames: {path: DataFrame} già letti una volta sola e condivisi (sola lettura), vedi startup.py
+    if frames is not None and path in frames:
+        return frames[path]
+    return pd.read_csv(path)
+
+
+def load_label_ids(path: str = FILM_DOUBLE_PATH, frames: dict = None) -> dict:
+    # Mappa precomputata {label: [ID, ...]} dei film con lo stesso label
+    label_ids = {}
+    for entity_id, label in read_frame(path, frames)[['ID', 'Label']].itertuples(index=False):
+        label_ids.setdefault(label, []).append(entity_id)
+    return label_ids
 
 
 class DecomposedData:
@@ -48,6 +73,7 @@ class MessageCleaner:
     def __init__(self):
         self.wh_pattern = re.compile(r'\b(who|what|when|where)\b', re.IGNORECASE)
 
+    @tracer.traced('clean')
     def clean(self, message: str) -> str:
         # Sostituisce ogni occorrenza di '-' con '–'
         message = message.replace(' - ', '–')
@@ -63,14 +89,15 @@ class MessageCleaner:
         return response.replace('[', '').replace(']', '').replace('{', '').replace('}', '').replace("'", '')
 
 class AttributeRecognizer:
-    def __init__(self):
-        data = pd.read_csv('dataset/relations.csv')
+    def __init__(self, frames: dict = None):
+        data = read_frame(RELATIONS_PATH, frames)
         self.relations_dict = {row['Label']: row['ID'] for _, row in data.iterrows()}
         
         # Configura KeywordProcessor per trovare il match perfetto più lungo
         self.keyword_processor = KeywordProcessor()
         for label in self.relations_dict.keys():
             self.keyword_processor.add_keyword(label)
+    @tracer.traced('relation_recognition')
     def recognize(self, recognized_labels: str) -> tuple:
         # Cerca match perfetti usando KeywordProcessor per ottenere il match più lungo
         perfect_matches = self.keyword_processor.extract_keywords(recognized_labels)
@@ -88,25 +115,22 @@ class AttributeRecognizer:
 
 
 class MessageDecomposer:
-    def __init__(self):
-        film_path = FILM_PATH
-        humans_path = 'dataset/humans_clean.csv'
-        entities_path = 'dataset/entities_clean.csv'
-        relations_path = 'dataset/relations.csv'
+    def __init__(self, frames: dict = None, ner_tagger=None):
+        # frames: CSV già letti ({path: DataFrame}), ner_tagger: modello NER già caricato (startup.py)
 
         #Data Class
         self.decomposed_data = DecomposedData({}, {})
 
         self.cleaner = MessageCleaner()
 
-        self.ner_tagger = SequenceTagger.load('ner')
-        self.relations_recognizer = AttributeRecognizer()
+        self.ner_tagger = SequenceTagger.load('ner') if ner_tagger is None else ner_tagger
+        self.relations_recognizer = AttributeRecognizer(frames)
 
         # Carica i dataset
-        self.film_dataset = pd.read_csv(film_path)
-        self.humans_dataset = pd.read_csv(humans_path)
-        self.entities_dataset = pd.read_csv(entities_path)
-        self.film_double_dataset = pd.read_csv('dataset/film_double.csv')
+        self.film_dataset = read_frame(FILM_PATH, frames)
+        self.humans_dataset = read_frame(HUMANS_PATH, frames)
+        self.entities_dataset = read_frame(ENTITIES_PATH, frames)
+        self.film_double_ids = load_label_ids(frames=frames)
 
         self.keyword_processor = KeywordProcessor(case_sensitive=True)
         for film in self.film_dataset['Label']:
@@ -123,6 +147,7 @@ class MessageDecomposer:
     # Clean the message decomposed
     def _clean_decomposed(self):
         self.decomposed_data = DecomposedData({}, {})
+    @tracer.traced('entity_linking')
     def _find_entity(self, message: str) -> tuple:
         modified_message = message
         entities = {}
@@ -157,8 +182,9 @@ class MessageDecomposer:
             modified_message, _ = search_and_replace(self.keyword_processor3, self.entities_dataset, modified_message)
 
         film_labels = self.film_dataset['Label'].tolist()
-        fuzzy_matches = process.extract(modified_message, film_labels, scorer=fuzz.token_set_ratio, limit=None,
-                                        score_cutoff=80)
+        with tracer.span('fuzzy_matching'):
+            fuzzy_matches = process.extract(modified_message, film_labels, scorer=fuzz.token_set_ratio, limit=None,
+                                            score_cutoff=80)
 
         for fuzzy_match in fuzzy_matches:
             match_label, score = fuzzy_match[0], fuzzy_match[1]
@@ -172,9 +198,9 @@ class MessageDecomposer:
 
     def _find_related_films(self, film_label):
         # Trova tutti i film con lo stesso label in film_double
-        related_films = self.film_double_dataset[self.film_double_dataset['Label'] == film_label]
-        return {row['ID']: row['Label'] for _, row in related_films.iterrows()}
+        return {entity_id: film_label for entity_id in self.film_double_ids.get(film_label, [])}
 
+    @tracer.traced('decompose')
     def decompose(self, message: str) -> DecomposedData:
         # First we clean the decomposed data, in order to avoid any previous data
         self._clean_decomposed()
@@ -183,7 +209,7 @@ class MessageDecomposer:
 
         # Cerca l'entità nei film, umani o entità generiche e sostituisci con "AAA" se match perfetto o plausibile
         modified_message, entities = self._find_entity(cleaned_message)
-        print(modified_message)
+        log.debug('Entity linking: %s -> %s', modified_message, entities)
 
         # Se viene trovata un'entità
         if entities:
@@ -227,7 +253,7 @@ class MessageDecomposer:
                 temp_entities = entities.copy()
                 # Dopo aver identificato le entità, verifica se hanno corrispondenti in film_double
                 for entity_id, label in temp_entities.items():
-                    if label in self.film_double_dataset['Label'].values:
+                    if label in self.film_double_ids:
                         related_entities = self._find_related_films(label)
                         entities.update(related_entities)  # Aggiungi le entità correlate senza duplicare
 
@@ -246,7 +272,8 @@ class MessageDecomposer:
             return self.decomposed_data.set_relations(relations).set_entities(entities)
 
         # Fallback NER solo se nessun film, umano o entità generica è stato trovato
-        self.ner_tagger.predict(sentence)
+        with tracer.span('ner'):
+            self.ner_tagger.predict(sentence)
         ner_entities = sentence.get_spans('ner')
         ner_dict = {}
         for ent in ner_entities:
@@ -259,17 +286,24 @@ class MessageDecomposer:
         # Cerca la relazione nella frase completa
         relation_id, relation_label = self.relations_recognizer.recognize(cleaned_message)
         relations = {relation_id: relation_label} if relation_id else {}
-        print(f"NER: ", ner_dict.items())
+        log.debug('NER entities: %s', ner_dict)
         return self.decomposed_data.set_relations(relations).set_entities(ner_dict)
 
 class MessageComposer:
-    def __init__(self, SPARQLQuerySolver, EmbeddingResolver, QueryGenerator, RecommendationSolver):
+    def __init__(self, SPARQLQuerySolver, EmbeddingResolver, QueryGenerator, RecommendationSolver, graph_tables=None,
+                 frames: dict = None):
         self.sparqlsolver = SPARQLQuerySolver
         self.embbsolver = EmbeddingResolver
         self.query_generator = QueryGenerator
-        self.film_dataset = pd.read_csv(FILM_PATH)
+        self.film_dataset = read_frame(FILM_PATH, frames)
+        self.film_double_ids = load_label_ids(frames=frames)
         self.recommsolver = RecommendationSolver
-        self.crowdsourcing = pd.read_csv('dataset/crowd_data/crowd_data_aggregated.csv')
+        # Same store as the crowd overlay of the SPARQL solver, if it has one
+        self.crowdsourcing = getattr(SPARQLQuerySolver, 'crowd', None)
+        if self.crowdsourcing is None:  # an empty store is falsy (__len__), but it is still the shared one
+            self.crowdsourcing = CrowdStore()
+        # Precomputed QID -> label / description tables (graph_tables.py), None: ask the graph
+        self.graph_tables = graph_tables
 
     #TODO: Implement the crowd_answer method
     def is_crowd_answerable(self, messagedecomposed: DecomposedData) -> bool:
@@ -294,26 +328,46 @@ class MessageComposer:
         relation_id = relation_id.split('/')[-1]
 
         # Check if the relation is in the crowd_data_aggregated.csv
-        return self.crowdsourcing[(self.crowdsourcing['Input1ID'] == entity_id) & (self.crowdsourcing['Input2ID'] == relation_id)].shape[0] > 0
+        return (entity_id, relation_id) in self.crowdsourcing
 
 
     def find_id_labels(self, label):
-        entity_row = self.film_dataset.loc[self.film_dataset['Label'] == label]
-        print(entity_row)
-        return {entity_row['ID']: label for _, entity_row in entity_row.iterrows()}
-
+        # Solo i film con label duplicato hanno più candidati (film_double.csv)
+        return {entity_id: label for entity_id in self.film_double_ids.get(label, [])}
+
+    @tracer.traced('descriptions')
+    def find_descriptions(self, entity_ids) -> dict:
+        # Descrizioni di tutte le entità con una sola query: {ID: [descriptions]}
+        entity_ids = list(entity_ids)
+        if not entity_ids:
+            return {}
+        if self.graph_tables is not None:
+            descriptions = {id: self.graph_tables.descriptions.get(id) for id in entity_ids}
+            return {id: [description] for id, description in descriptions.items() if description is not None}
+        sparql_query = self.query_generator.generate_description_query(entity_ids)
+        return self.sparqlsolver.solveDescriptionQuery(sparql_query)
+
+    def resolve_labels(self, results: list) -> list:
+        # Sostituisce gli IRI delle entità con il loro label (query generate con skip_label_hop)
+        if self.graph_tables is None or not results:
+            return results
+        labels = [self.graph_tables.labels.get(result, result) if result.startswith('http://www.wikidata.org/entity/')
+                  else result for result in results]
+        return [label for label in labels if not label.startswith('http://www.wikidata.org/entity/')]
+
+    @tracer.traced('compose')
     def compose(self, messagedecomposed: DecomposedData):
         decomposed = messagedecomposed.data.copy()
         # Assuming you are retrieving the first entity ID from the 'entities' dictionary
         entity_labels = list(decomposed['entities'].values())
         if not decomposed['relations']: # If there are no relations, we assume is a Recommendation
-            recommendation_dict = self.recommsolver.process_recommendation_direct(decomposed['entities'])
+            with tracer.span('recommendation'):
+                recommendation_dict = self.recommsolver.process_recommendation_direct(decomposed['entities'])
             # Give the node description for each entity of the recommendation dict
             message_result = f"Here is a list of recommendations that may interest you: \n"
+            descriptions = self.find_descriptions(recommendation_dict.keys())
             for id, label in recommendation_dict.items():
-                local_dict = {'entities': {id: label}, 'relations': {'': 'node description'}}
-                sparql_query = self.query_generator.generate_query(local_dict)
-                node_info = self.sparqlsolver.solveQuery(sparql_query) if sparql_query else None
+                node_info = descriptions.get(id, [])
 
                 message_result += f"\n- {label} ({node_info}) \n"
             #We dont need to provide the id, only the label, and the node info
@@ -324,17 +378,15 @@ class MessageComposer:
 
             if len(id_labels) > 1:
                 message_result = "According to our knowledge graph, there are multiple entities that you could be referring to, the answers are:"
+                # One query for the result and the node info of every candidate
+                sparql_query = self.query_generator.generate_disambiguation_query(
+                    decomposed, list(id_labels), with_descriptions=self.graph_tables is None)
+                answers = self.sparqlsolver.solveDisambiguationQuery(sparql_query)
+                descriptions = self.find_descriptions(id_labels) if self.graph_tables is not None else {}
                 for id, label in id_labels.items():
-                    local_dict = decomposed.copy()
-                    local_dict['entities'] = {id: label}
-                    # Generate the SPARQL query
-                    sparql_query = self.query_generator.generate_query(local_dict)
-                    # Get the result from the knowledge graph
-                    kg_result = self.sparqlsolver.solveQuery(sparql_query) if sparql_query else "No details found"
-                    # Get the node info
-                    local_dict['relations'] = {'': "node description"}
-                    sparql_query = self.query_generator.generate_query(local_dict)
-                    node_info = self.sparqlsolver.solveQuery(sparql_query) if sparql_query else None
+                    answer = answers.get(id, {})
+                    kg_result = self.resolve_labels(answer.get('result', []))
+                    node_info = descriptions.get(id, answer.get('description', []))
                     # Append the result if found, if not append a message
                     message_result += f"\nFor {label} ({node_info}), the found result is {kg_result}" if kg_result else f"\nFor {label} ({node_info}), no details found."
                 return message_result
@@ -345,9 +397,24 @@ class MessageComposer:
         sparql_query = self.query_generator.generate_query(decomposed)
 
         # Ger either the result from the graph and the result from the embeddings
-        kg_result = self.sparqlsolver.solveQuery(sparql_query) if sparql_query else None  # "No query generated"
-        embedding_result = self.embbsolver.find_most_plausible_responses(decomposed, top_n=3)
-        print(kg_result, embedding_result)
+        if self.graph_tables is not None and decomposed['entities'] and 'node description' in decomposed['relations'].values():
+            kg_result = self.find_descriptions(decomposed['entities']).get(list(decomposed['entities'])[0], [])
+        elif decomposed['entities'] and decomposed['relations']:
+            # Graph answer with the crowd overlay applied (crowd corrections take precedence)
+            entity_id, relation_id = list(decomposed['entities'])[0], list(decomposed['relations'])[0]
+            kg_result, crowd_answer = self.sparqlsolver.solveTriple(sparql_query, entity_id, relation_id)
+            kg_result = self.resolve_labels(kg_result)
+            if crowd_answer is not None and crowd_answer.majority_answer != 0 and kg_result:
+                return f"According to the crowd, the answer to your question is {kg_result}. " \
+                       f"[Crowd, inter-rater agreement {crowd_answer.kappa:.3f}, The answer distribution for this " \
+                       f"specific task was {crowd_answer.support_votes} support votes, " \
+                       f"{crowd_answer.reject_votes} reject votes]"
+        else:
+            kg_result = self.sparqlsolver.solveQuery(sparql_query) if sparql_query else None  # "No query generated"
+            kg_result = self.resolve_labels(kg_result)
+        with tracer.span('embeddings'):
+            embedding_result = self.embbsolver.find_most_plausible_responses(decomposed, top_n=3)
+        log.debug('Graph result: %s, embedding result: %s', kg_result, embedding_result)
         if not kg_result and not embedding_result:
             return "Oh :-( No results found. Please try again with a different question. \
             Check maybe the spelling of the Film or Person you are looking for :)"
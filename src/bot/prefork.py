@@ -0,0 +1,191 @@
+import gc
+import multiprocessing
+import os
+import queue
+
+from typing import Callable
+
+from src.bot.log import get_logger, setup_worker_logging, forward_worker_logs, listener_paused
+from src.bot.tracing import tracer
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+log = get_logger('prefork')
+
+
+def _limit_torch_threads(threads: int):
+    # Ogni worker usa solo la sua parte dei core per il modello NER, altrimenti N worker x N thread si contendono la CPU
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+def _worker_main(index: int, handler: Callable[[str], str], tasks, results, log_queue, threads: int,
+                 metrics_port: int = None):
+    setup_worker_logging(log_queue)
+    _limit_torch_threads(threads)
+    if metrics_port:
+        tracer.serve_prometheus(metrics_port)
+    log.info("Worker %s started (pid %s)", index, os.getpid())
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, message = task
+        try:
+            response = handler(message)
+        except Exception as e:
+            log.error("Worker %s failed on task %s: %s", index, task_id, e)
+            response = f"An error occurred during message processing: {e}"
+        results.put((task_id, response))
+
+
+class WorkerPool:
+    def __init__(self, handler: Callable[[str], str], workers: int, metrics_port: int = None):
+        """WorkerPool - pre-fork pool answering the questions of the bot in `workers` processes.
+
+        The processes are forked from the master once its components are loaded, so the graph, the label frames, the
+        NER model and the (memory-mapped) embeddings and similarity matrix are shared copy-on-write instead of being
+        loaded once per process. The master keeps the Speakeasy session: it polls the rooms, pins every room to one
+        worker (the questions of a room are answered in order) and posts the answers.
+
+        Start the pool before creating any thread that the workers must not inherit (Speakeasy client, outbox,
+        metrics server).
+
+        Args:
+            handler (callable): question -> answer, called in the workers (e.g. Agent.process_message).
+            workers (int): Number of worker processes.
+            metrics_port (int, optional): Worker i serves its latency histograms on metrics_port + 1 + i.
+        """
+        self.handler = handler
+        self.n_workers = workers
+        self.metrics_port = metrics_port
+        self.processes = []
+        self.__context = multiprocessing.get_context('fork')  # copy-on-write: only fork shares the loaded objects
+        self.__tasks = []  # one queue per worker, so a room's questions stay in order
+        self.__results = self.__context.Queue()
+        self.__log_queue = self.__context.Queue()
+        self.__log_listener = None
+        self.__room_worker = {}  # room_id -> worker index
+        self.__pending = {}  # task_id -> (room, message, worker index)
+        self.__next_task = 0
+
+    def start(self) -> 'WorkerPool':
+        # Gli oggetti caricati finora escono dal garbage collector: le sue scansioni non toccano (e copiano) le loro pagine
+        gc.collect()
+        gc.freeze()
+        threads = max(1, (os.cpu_count() or 1) // self.n_workers)
+        # Nessun thread di logging attivo durante le fork (i lock che tiene verrebbero copiati nei figli)
+        with listener_paused():
+            for index in range(self.n_workers):
+                tasks = self.__context.Queue()
+                self.__tasks.append(tasks)
+                self.processes.append(self.__fork(index, tasks, threads))
+        self.__log_listener = forward_worker_logs(self.__log_queue)
+        log.info("Forked %s workers: %s", self.n_workers, [process.pid for process in self.processes])
+        return self
+
+    def __fork(self, index: int, tasks, threads: int):
+        metrics_port = self.metrics_port + 1 + index if self.metrics_port else None
+        process = self.__context.Process(target=_worker_main, name=f'bot-worker-{index}', daemon=True,
+                                         args=(index, self.handler, tasks, self.__results, self.__log_queue, threads,
+                                               metrics_port))
+        process.start()
+        return process
+
+    def assign(self, room_id: str) -> int:
+        ''' Worker of the room: a new room goes to the worker with the fewest rooms '''
+        worker = self.__room_worker.get(room_id)
+        if worker is None:
+            alive = [index for index, process in enumerate(self.processes) if process.is_alive()]
+            if not alive:
+                raise RuntimeError('All the bot workers have exited')
+            loads = {index: 0 for index in alive}
+            for assigned in self.__room_worker.values():
+                if assigned in loads:
+                    loads[assigned] += 1
+            worker = self.__room_worker[room_id] = min(alive, key=lambda index: loads[index])
+        return worker
+
+    def retain(self, room_ids):
+        ''' Forget the assignment of the rooms that are no longer active '''
+        room_ids = set(room_ids)
+        for room_id in list(self.__room_worker):
+            if room_id not in room_ids:
+                del self.__room_worker[room_id]
+
+    def submit(self, room, message: str):
+        ''' Queue a question of `room` on the worker of the room, the answer is returned by collect() '''
+        worker = self.assign(room.room_id)
+        task_id = self.__next_task
+        self.__next_task += 1
+        self.__pending[task_id] = (room, message, worker)
+        self.__tasks[worker].put((task_id, message))
+
+    def collect(self, timeout: float = 0.0) -> list:
+        '''
+        Answers ready so far, waiting up to `timeout` seconds for the first one when there are questions in flight.
+
+        Returns:
+            list: [(room, answer)]
+        '''
+        answers = []
+        while self.__pending:
+            try:
+                task_id, response = self.__results.get(timeout=timeout) if not answers and timeout else \
+                    self.__results.get_nowait()
+            except queue.Empty:
+                break
+            room, _, _ = self.__pending.pop(task_id)
+            answers.append((room, response))
+        if not answers and self.__pending:
+            self.__recover()
+        return answers
+
+    def __recover(self):
+        # Le stanze di un worker terminato passano agli altri, con le domande ancora senza risposta
+        dead = {index for index, process in enumerate(self.processes) if not process.is_alive()}
+        if not dead:
+            return
+        for room_id, worker in list(self.__room_worker.items()):
+            if worker in dead:
+                del self.__room_worker[room_id]
+        for task_id, (room, message, worker) in sorted(self.__pending.items()):
+            if worker in dead:
+                log.error("Worker %s exited (code %s), question of room %s moved to another worker",
+                          worker, self.processes[worker].exitcode, room.room_id)
+                new_worker = self.assign(room.room_id)
+                self.__pending[task_id] = (room, message, new_worker)
+                self.__tasks[new_worker].put((task_id, message))
+
+    def memory_report(self) -> dict:
+        '''
+        RSS, PSS and USS (MB) of the master and of every worker. The USS of a worker is what it does not share
+        (pages it wrote since the fork): the total is close to master RSS + sum of the worker USS, instead of
+        (workers + 1) x master RSS with independent processes.
+        '''
+        if psutil is None:
+            return {}
+        processes = [('master', os.getpid())] + [(process.name, process.pid) for process in self.processes
+                                                 if process.is_alive()]
+        report = {}
+        for name, pid in processes:
+            info = psutil.Process(pid).memory_full_info()
+            report[name] = {metric: round(getattr(info, metric) / 1e6, 1) for metric in ('rss', 'pss', 'uss')}
+        return report
+
+    def close(self, timeout: float = 10.0):
+        for tasks in self.__tasks:
+            tasks.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        if self.__log_listener is not None:
+            self.__log_listener.stop()
+            self.__log_listener = None
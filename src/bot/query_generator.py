@@ -3,14 +3,23 @@ import rdflib
 import difflib
 import pandas as pd
 
+from src.bot.log import get_logger
+
+log = get_logger('query_generator')
+
+# Relazioni con un valore letterale (es. 'publication date', 'box office', 'IMDb ID', 'image'): nessun label da cercare
+LITERAL_RELATIONS = ['P577', 'P2142', 'P345', 'P18']
+
 class QueryGenerator:
-    def __init__(self):
-        pass
+    def __init__(self, skip_label_hop: bool = False):
+        # With skip_label_hop the queries return the entity IRIs instead of joining on rdfs:label,
+        # the labels are then read from the precomputed graph tables (see graph_tables.py)
+        self.skip_label_hop = skip_label_hop
 
     def generate_query(self, message_output):
         # Estrai entità e relazioni dall'output
         entities = message_output.get('entities', {})
-        print(entities)
+        log.debug('Generating query for %s', entities)
         relations = message_output.get('relations', {})
 
         # Controlla se mancano entità o relazioni
@@ -30,45 +39,85 @@ class QueryGenerator:
         # Converte il label della relazione in camel case
         relation_label = self._to_camel_case(relation_label)
 
-        # Caso 1: Se la relazione è associata a un dato letterale (es. data, numero)
-        if relation_id in ['P577', 'P2142', 'P345', 'P18', 'P345']:  # Esempi di proprietà letterali come 'publication date' o 'box office'
-            query = f"""
-                            PREFIX wd: <http://www.wikidata.org/entity/>
-                            PREFIX wdt: <http://www.wikidata.org/prop/direct/>
+        variable, pattern = self._result_pattern(f"wd:{entity_id}", relation_id, relation_label)
+        query = f"""
+                        PREFIX wd: <http://www.wikidata.org/entity/>
+                        PREFIX wdt: <http://www.wikidata.org/prop/direct/>
+                        PREFIX schema: <http://schema.org/>
 
-                            SELECT ?{relation_label} WHERE {{
-                                wd:{entity_id} wdt:{relation_id} ?{relation_label} .
-                            }}
-                            """
+                        SELECT ?{variable} WHERE {{
+                            {pattern}
+                        }}
+                        """
 
-        # Caso 2: Se la relazione è "node description"
-        elif relation_label == "nodeDescription":
-            query = f"""
-                            PREFIX wd: <http://www.wikidata.org/entity/>
-                            PREFIX schema: <http://schema.org/>
+        return query
+
+    def generate_description_query(self, entity_ids):
+        # Una sola query per le descrizioni di più entità (es. i film raccomandati), invece di una query per entità
+        values = ' '.join(f"wd:{entity_id.split('/')[-1]}" for entity_id in entity_ids)
+        query = f"""
+                        PREFIX wd: <http://www.wikidata.org/entity/>
+                        PREFIX schema: <http://schema.org/>
+
+                        SELECT ?entity ?description WHERE {{
+                            VALUES ?entity {{ {values} }}
+                            ?entity schema:description ?description .
+                        }}
+                        """
+        return query
 
-                            SELECT ?description WHERE {{
-                                wd:{entity_id} schema:description ?description .
-                            }}
-                            """
+    def generate_disambiguation_query(self, message_output, entity_ids, with_descriptions: bool = True):
+        # Relazione richiesta e descrizione di tutti i candidati (film con lo stesso label) in una sola query.
+        # ?kind distingue le due parti della UNION: "result" oppure "description"
+        relations = message_output.get('relations', {})
+        if not entity_ids:
+            return "No entity recognized"
+        if not relations:
+            return "No relation recognized"
 
+        relation_id_full, relation_label = list(relations.items())[0]
+        relation_id = relation_id_full.split('/')[-1]
+        relation_label = self._to_camel_case(relation_label)
+        values = ' '.join(f"wd:{entity_id.split('/')[-1]}" for entity_id in entity_ids)
+
+        # Stessi casi di generate_query, il risultato viene rinominato ?value per la UNION con le descrizioni
+        variable, pattern = self._result_pattern("?entity", relation_id, relation_label)
+        result_pattern = f"{pattern} BIND(?{variable} AS ?value)"
+        description_pattern = """
+                            UNION
+                            { ?entity schema:description ?value . BIND("description" AS ?kind) }""" if with_descriptions else ''
 
-        # Caso 3: Relazioni standard con entità collegate
-        else:
-            query = f"""
-                        PREFIX ddis: <http://ddis.ch/atai/>
+        query = f"""
                         PREFIX wd: <http://www.wikidata.org/entity/>
                         PREFIX wdt: <http://www.wikidata.org/prop/direct/>
                         PREFIX schema: <http://schema.org/>
 
-                        SELECT ?{relation_label} WHERE {{
-                            wd:{entity_id} wdt:{relation_id} ?{relation_label}Item .
-                            ?{relation_label}Item rdfs:label ?{relation_label} .
+                        SELECT ?entity ?kind ?value WHERE {{
+                            VALUES ?entity {{ {values} }}
+                            {{ {result_pattern} BIND("result" AS ?kind) }}{description_pattern}
                         }}
                         """
-
         return query
 
+    def _result_pattern(self, subject: str, relation_id: str, relation_label: str) -> tuple:
+        '''
+        Triple patterns answering `relation` of `subject`, shared by generate_query and generate_disambiguation_query.
+
+        Returns:
+            tuple: (name of the variable bound to the answer, patterns)
+        '''
+        # Caso 1: Se la relazione è associata a un dato letterale (es. data, numero)
+        if relation_id in LITERAL_RELATIONS:
+            return relation_label, f"{subject} wdt:{relation_id} ?{relation_label} ."
+        # Caso 2: Se la relazione è "node description"
+        if relation_label == "nodeDescription":
+            return "description", f"{subject} schema:description ?description ."
+        # Caso 3: Relazioni standard con entità collegate (IRI, oppure il loro label)
+        if self.skip_label_hop:
+            return f"{relation_label}Item", f"{subject} wdt:{relation_id} ?{relation_label}Item ."
+        return relation_label, (f"{subject} wdt:{relation_id} ?{relation_label}Item . "
+                                f"?{relation_label}Item rdfs:label ?{relation_label} .")
+
     def _to_camel_case(self, label):
         # Trasforma la stringa in camel case
         words = label.split(' ')
@@ -1,6 +1,16 @@
-from rdflib.namespace import Namespace
-from typing import List
+from rdflib.namespace import Namespace, RDFS
+from typing import Dict, List, Optional, Tuple
 import rdflib
+import os
+import re
+
+from src.bot.graph_loader import load_triples, PRUNED_GRAPH_PATH
+from src.bot.graph_tables import GRAPH_PATH
+from crowdsourcing.crowdsourcing_handler import CrowdAnswer
+from src.bot.tracing import tracer
+from src.bot.log import get_logger
+
+log = get_logger('sparql')
 
 
 class SPARQLQuerySolver:
@@ -10,15 +20,99 @@ class SPARQLQuerySolver:
     #SCHEMA = Namespace('http://schema.org/')
     #DDIS = Namespace('http://ddis.ch/atai/')
 
-    def __init__(self, data_path: str = 'dataset/14_graph.nt', format: str = 'turtle'):
+    def __init__(self, data_path: str = None, format: str = 'turtle', workers: int = None, crowd=None,
+                 mp_context: str = None):
+        # crowd: CrowdStore whose answers are applied as an overlay by solveTriple, the graph itself is not modified
+        self.crowd = crowd
+        # Default: the pruned subgraph (graph_loader.prune_graph) if it has been built, else the full graph
+        if data_path is None:
+            data_path = PRUNED_GRAPH_PATH if os.path.exists(PRUNED_GRAPH_PATH) else GRAPH_PATH
         self.graph = rdflib.Graph()
-        self.graph.parse(data_path, format=format)
+        if workers:
+            # N-Triples parsed in parallel by graph_loader, then added to the graph
+            encoded = load_triples(data_path, workers, context=mp_context)
+            if encoded.malformed:
+                # Righe che il loader non sa leggere: rdflib le interpreta (o fallisce) invece di perdere le triple
+                log.warning("%s lines of %s not understood by the parallel loader, parsing the file with rdflib",
+                            encoded.malformed, data_path)
+                self.graph.parse(data_path, format=format)
+            else:
+                encoded.to_rdflib(self.graph)
+        else:
+            self.graph.parse(data_path, format=format)
 
+    @tracer.traced('sparql')
     def solveQuery(self, query: str) -> List[str]:
         try:
             results = self.graph.query(query)
             # Extract only the literal
             return [str(result[0]) for result in results]
         except Exception as e:
-            print(f"An error occurred during SPARQL query execution: {e}")
-            return ['An error occurred during SPARQL query execution. Please check the query syntax.'] #TODO: being able to correct the queries
\ No newline at end of file
+            log.error("An error occurred during SPARQL query execution: %s", e)
+            return ['An error occurred during SPARQL query execution. Please check the query syntax.'] #TODO: being able to correct the queries
+
+    @tracer.traced('sparql')
+    def solveDescriptionQuery(self, query: str) -> Dict[str, List[str]]:
+        """Run a query generated by QueryGenerator.generate_description_query.
+
+        Returns:
+            dict: {entity URI: [descriptions]}, entities without a description are missing.
+        """
+        descriptions = {}
+        try:
+            for entity, description in self.graph.query(query):
+                descriptions.setdefault(str(entity), []).append(str(description))
+        except Exception as e:
+            log.error("An error occurred during SPARQL query execution: %s", e)
+        return descriptions
+
+    @tracer.traced('sparql')
+    def solveDisambiguationQuery(self, query: str) -> Dict[str, Dict[str, List[str]]]:
+        """Run a query generated by QueryGenerator.generate_disambiguation_query.
+
+        Returns:
+            dict: {entity URI: {'result': [values], 'description': [descriptions]}}
+        """
+        answers = {}
+        try:
+            for entity, kind, value in self.graph.query(query):
+                answers.setdefault(str(entity), {'result': [], 'description': []})[str(kind)].append(str(value))
+        except Exception as e:
+            log.error("An error occurred during SPARQL query execution: %s", e)
+        return answers
+
+    def solveTriple(self, query: str, entity_id: str, relation_id: str) -> Tuple[List[str], Optional[CrowdAnswer]]:
+        """Answer (entity, relation) with `query`, overlaid with the crowd answer of the pair if there is one.
+
+        Precedence: a value the crowd rejected is removed from the graph results and replaced by the crowd's
+        correction if one was proposed (the other values of a multi-valued relation are kept); a value the crowd
+        confirmed is added if the graph lacks it; ties keep the graph results.
+
+        Returns:
+            tuple: (results, CrowdAnswer or None), the CrowdAnswer carries the votes and the kappa.
+        """
+        answer = self.crowd.get(entity_id, relation_id) if self.crowd is not None else None
+        results = self.solveQuery(query)
+        if answer is None:
+            return results, answer
+        if answer.value is not None:
+            crowd_forms = self.__forms(answer.value)
+            if answer.majority_answer == 2:
+                results = [result for result in results if result not in crowd_forms]
+            elif answer.majority_answer == 1 and not crowd_forms.intersection(results):
+                results = results + [self.__render(answer.value)]
+        if answer.majority_answer == 2 and answer.corrected_value \
+                and not self.__forms(answer.corrected_value).intersection(results):
+            results = results + [self.__render(answer.corrected_value)]
+        return results, answer
+
+    def __forms(self, value: str) -> set:
+        # Forme in cui un valore del crowd puo' comparire nei risultati: label, QID, IRI
+        return {self.__render(value), value, 'http://www.wikidata.org/entity/' + value}
+
+    def __render(self, value: str) -> str:
+        # I valori del crowd sono QID o letterali: i QID vengono mostrati con il loro label
+        if re.fullmatch(r'Q\d+', value):
+            label = self.graph.value(rdflib.URIRef('http://www.wikidata.org/entity/' + value), RDFS.label)
+            return str(label) if label is not None else value
+        return value
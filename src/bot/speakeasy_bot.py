@@ -1,27 +1,50 @@
 from speakeasypy import Speakeasy
+import os
 import time
 import re
-from src.bot.sparql_queries import SPARQLQuerySolver  # Importa il solver delle query SPARQL
-from src.bot.message_processor import MessageDecomposer, MessageComposer, DecomposedData
-from src.bot.query_generator import QueryGenerator
-from recommender.recommender import RecommendationSolver
-from embeddings.embeddings import EmbeddingResolver  # Importa l'EmbeddingResolver
+from src.bot.startup import load_components, format_report
+from src.bot.prefork import WorkerPool
+from src.bot.tracing import tracer
+from src.bot.log import get_logger
+
+log = get_logger('agent')
 
 DEFAULT_HOST_URL = 'https://speakeasy.ifi.uzh.ch'
 listen_freq = 2
+POOL_THREADS = 8  # parallel room-state requests per polling cycle
+RESULT_WAIT = 0.05  # seconds the master waits for the answers of the workers per polling cycle
 
 
 class Agent:
-    def __init__(self, username, password):
+    def __init__(self, username, password, host=DEFAULT_HOST_URL, trace_path=None, metrics_port=None,
+                 parallel_startup=True, workers=1, recommendation_backend=None, similarity_path=None):
         self.username = username
-        self.speakeasy = Speakeasy(host=DEFAULT_HOST_URL, username=username, password=password)
-        self.solver = SPARQLQuerySolver()  # Solver per le query SPARQL
-        self.message_decomposer = MessageDecomposer()  # Inizializza il decompositore di messaggi
-        self.query_generator = QueryGenerator()
-        self.embedding_resolver = EmbeddingResolver()  # Inizializza l'EmbeddingResolver
-        self.recommendation_resolver = RecommendationSolver()  # Inizializza il RecommendationResolver
-        self.message_composer = MessageComposer(self.solver, self.embedding_resolver, self.query_generator, self.recommendation_resolver)
+        # Tracing dei tempi per domanda: spans in JSON lines su trace_path, istogrammi su http://localhost:metrics_port/metrics
+        if trace_path or metrics_port:
+            tracer.enable(trace_path)
+        # Componenti indipendenti caricati in parallelo (startup.py), i CSV sono letti una volta sola e condivisi
+        # recommendation_backend / similarity_path: vedi RecommendationSolver (default: variabili d'ambiente BOT_*)
+        components, steps, startup_s = load_components(workers=os.cpu_count(), parallel=parallel_startup,
+                                                       recommendation_backend=recommendation_backend,
+                                                       similarity_path=similarity_path)
+        print(format_report(steps, startup_s))
+        self.crowd_store = components['crowd']  # Risposte del crowd, ricaricate quando il CSV cambia
+        self.solver = components['solver']  # Solver per le query SPARQL, grafo caricato in parallelo
+        self.message_decomposer = components['decomposer']
+        self.graph_tables = components['graph_tables']  # QID -> label / description, None if not built
+        self.query_generator = components['query_generator']
+        self.embedding_resolver = components['embeddings']
+        self.recommendation_resolver = components['recommender']
+        self.message_composer = components['composer']
 
+        # workers > 1: processi forkati ora, prima dei thread del client Speakeasy, che condividono i componenti caricati
+        self.workers = None
+        if workers > 1:
+            self.workers = WorkerPool(self.process_message, workers, metrics_port=metrics_port).start()
+        if metrics_port:
+            tracer.serve_prometheus(metrics_port)
+        self.speakeasy = Speakeasy(host=host, username=username, password=password,
+                                   pool_size=POOL_THREADS, pool_threads=POOL_THREADS, non_blocking_posts=True)
         self.speakeasy.login()
 
     def listen(self):
@@ -31,17 +54,36 @@ class Agent:
                 if not room.initiated:
                     room.post_messages(f'Hello! This is a welcome message from {room.my_alias}.')
                     room.initiated = True
-                for message in room.get_messages(only_partner=True, only_new=True):
-                    print(f"\t- Chatroom {room.room_id} - new message #{message.ordinal}: '{message.message}'")
-                    response = self.process_message(message.message)
-                    room.post_messages(response.encode('utf-8').decode('latin-1'))
-                    room.mark_as_processed(message)
+            if self.workers is not None:
+                self.workers.retain(room.room_id for room in rooms)
 
-                for reaction in room.get_reactions(only_new=True):
-                    print(f"\t- Chatroom {room.room_id} - new reaction #{reaction.message_ordinal}: '{reaction.type}'")
+            # States of all active rooms are fetched in parallel and merged into one stream of new events
+            for event in self.speakeasy.get_new_events(active=True, only_partner=True):
+                room = event.room
+                if event.kind == 'message':
+                    message = event.item
+                    log.info("Chatroom %s - new message #%s: '%s'", room.room_id, message.ordinal, message.message)
+                    if self.workers is not None:
+                        # Risponde il worker della stanza, la risposta viene pubblicata da collect() sotto
+                        self.workers.submit(room, message.message)
+                    else:
+                        self.post_response(room, self.process_message(message.message))
+                    room.mark_as_processed(message)
+                else:
+                    reaction = event.item
+                    log.info("Chatroom %s - new reaction #%s: '%s'", room.room_id, reaction.message_ordinal, reaction.type)
                     room.post_messages(f"Received your reaction: '{reaction.type}'")
                     room.mark_as_processed(reaction)
 
+            if self.workers is not None:
+                for room, response in self.workers.collect(timeout=RESULT_WAIT):
+                    self.post_response(room, response)
+
+    def post_response(self, room, response: str):
+        # Non tracciato: con l'outbox il post viene solo accodato, l'invio avviene dopo, su un altro thread
+        room.post_messages(response.encode('utf-8').decode('latin-1'))
+
+    @tracer.traced('process_message')
     def process_message(self, message):
         message = message.strip()
         
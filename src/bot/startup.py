@@ -0,0 +1,155 @@
+import argparse
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import pandas as pd
+
+from src.bot.sparql_queries import SPARQLQuerySolver
+from src.bot.message_processor import MessageDecomposer, MessageComposer, FILM_PATH, FILM_DOUBLE_PATH, \
+    HUMANS_PATH, ENTITIES_PATH, RELATIONS_PATH
+from src.bot.query_generator import QueryGenerator
+from src.bot.graph_tables import load_graph_tables
+from crowdsourcing.crowdsourcing_handler import CrowdStore
+from recommender.recommender import RecommendationSolver
+from embeddings.embeddings import EmbeddingResolver
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# CSV letti una volta sola e condivisi (sola lettura) da decomposer, composer, embeddings e recommender
+SHARED_CSVS = [FILM_PATH, FILM_DOUBLE_PATH, HUMANS_PATH, ENTITIES_PATH, RELATIONS_PATH]
+
+
+class StartupStep(NamedTuple):
+    name: str
+    start_s: float  # offset from the beginning of the startup, after the dependencies were ready
+    load_s: float
+    rss_delta_mb: float  # process RSS growth while the step ran (overlapping steps share it when parallel)
+    thread: str
+
+
+def _rss_mb() -> float:
+    if psutil is None:
+        return float('nan')
+    return psutil.Process().memory_info().rss / 1e6
+
+
+def _load_ner_tagger():
+    from flair.models import SequenceTagger
+    try:
+        return SequenceTagger.load('ner')
+    except Exception as e:
+        raise RuntimeError("flair's NER model could not be loaded: it is downloaded on first use, so it needs the "
+                           "network or flair's cache. Offline, pass ner_tagger= to load_components.") from e
+
+
+def _tasks(workers: int, mp_context: str, ner_tagger=None, recommendation_backend: str = None,
+           similarity_path: str = None) -> list:
+    '''
+    (name, dependencies, function of the dependency results) in dependency order. The CSVs, the graph, the NER
+    model, the crowd data and the graph tables don't depend on anything, the components wait only for what they use.
+    '''
+    def frames(results):
+        return {path: results[path] for path in SHARED_CSVS}
+
+    tasks = [(path, [], lambda results, path=path: pd.read_csv(path)) for path in SHARED_CSVS]
+    tasks += [
+        ('crowd', [], lambda results: CrowdStore()),
+        ('graph_tables', [], lambda results: load_graph_tables()),
+        ('ner', [], lambda results: _load_ner_tagger() if ner_tagger is None else ner_tagger),
+        ('solver', ['crowd'], lambda results: SPARQLQuerySolver(workers=workers, crowd=results['crowd'],
+                                                                mp_context=mp_context)),
+        ('decomposer', SHARED_CSVS + ['ner'], lambda results: MessageDecomposer(frames(results), results['ner'])),
+        ('embeddings', [ENTITIES_PATH], lambda results: EmbeddingResolver(results[ENTITIES_PATH])),
+        ('recommender', [FILM_PATH],
+         lambda results: RecommendationSolver(similarity_path, backend=recommendation_backend,
+                                              films_df=results[FILM_PATH])),
+        ('query_generator', ['graph_tables'],
+         lambda results: QueryGenerator(skip_label_hop=results['graph_tables'] is not None)),
+        ('composer', SHARED_CSVS + ['solver', 'embeddings', 'query_generator', 'recommender', 'graph_tables'],
+         lambda results: MessageComposer(results['solver'], results['embeddings'], results['query_generator'],
+                                         results['recommender'], graph_tables=results['graph_tables'],
+                                         frames=frames(results))),
+    ]
+    return tasks
+
+
+def load_components(workers: int = None, parallel: bool = True, ner_tagger=None, recommendation_backend: str = None,
+                    similarity_path: str = None) -> tuple:
+    """Build the bot's components, the independent ones concurrently in threads.
+
+    The slow steps either release the GIL (CSV parsing, numpy loads, model loading) or run in processes (the graph
+    is parsed by a process pool started from a fork server, so no thread of the bot is forked), so the startup
+    takes about as long as its slowest chain (graph -> solver -> composer) instead of the sum of the steps.
+
+    Args:
+        workers (int, optional): Processes parsing the graph, None: rdflib's sequential parser.
+        parallel (bool): False builds the steps one after another (exact memory attribution per step).
+        ner_tagger (optional): Object with flair's predict(sentence) used instead of SequenceTagger.load('ner'),
+            which downloads the model on first use (e.g. benchmarks.fixtures.FixtureTagger offline).
+        recommendation_backend (str, optional): 'matrix' or 'embeddings', default RECOMMENDATION_BACKEND
+            (env BOT_RECOMMENDATION_BACKEND).
+        similarity_path (str, optional): Similarity file of the 'matrix' backend, its format is picked from the
+            extension (env BOT_SIMILARITY_PATH, default: the first existing of top-k, float32 and parquet).
+
+    Returns:
+        tuple: ({name: object}, [StartupStep], total seconds)
+    """
+    tasks = _tasks(workers, 'forkserver' if parallel else None, ner_tagger, recommendation_backend, similarity_path)
+    results, steps = {}, []
+    start = time.perf_counter()
+
+    def run(name, dependencies, build, futures=None):
+        if futures is not None:
+            inputs = {dependency: futures[dependency].result() for dependency in dependencies}
+        else:
+            inputs = results
+        step_start, rss = time.perf_counter(), _rss_mb()
+        value = build(inputs)
+        end = time.perf_counter()
+        steps.append(StartupStep(name, step_start - start, end - step_start, _rss_mb() - rss,
+                                 threading.current_thread().name))
+        return value
+
+    if parallel:
+        # Un thread per step: gli step che aspettano le dipendenze non bloccano gli altri
+        with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix='startup') as executor:
+            futures = {}
+            for name, dependencies, build in tasks:
+                futures[name] = executor.submit(run, name, dependencies, build, futures)
+            results = {name: future.result() for name, future in futures.items()}
+    else:
+        for name, dependencies, build in tasks:
+            results[name] = run(name, dependencies, build)
+
+    steps.sort(key=lambda step: step.start_s)
+    return results, steps, time.perf_counter() - start
+
+
+def format_report(steps: list, total_s: float) -> str:
+    lines = [f"{'step':<28} {'start s':>8} {'load s':>8} {'RSS +MB':>9}  thread"]
+    for step in steps:
+        lines.append(f"{os.path.basename(step.name):<28} {step.start_s:>8.2f} {step.load_s:>8.2f} "
+                     f"{step.rss_delta_mb:>9.1f}  {step.thread}")
+    lines.append(f"Startup {total_s:.2f}s (sum of the steps {sum(step.load_s for step in steps):.2f}s), "
+                 f"RSS {_rss_mb():.0f} MB")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load the bot components and report the time and memory per step.')
+    parser.add_argument('--sequential', action='store_true', help='one step after another')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes parsing the graph')
+    parser.add_argument('--recommendation-backend', choices=['matrix', 'embeddings'])
+    parser.add_argument('--similarity-path', help='similarity file of the matrix backend (.npz, .npy or .parquet)')
+    args = parser.parse_args()
+    _, steps, total_s = load_components(args.workers, parallel=not args.sequential,
+                                        recommendation_backend=args.recommendation_backend,
+                                        similarity_path=args.similarity_path)
+    print(format_report(steps, total_s))
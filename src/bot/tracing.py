@@ -0,0 +1,165 @@
+import bisect
+import functools
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (ms) of the latency histogram buckets, +Inf is implicit
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect.bisect_left(self.buckets, value_ms)] += 1
+        self.count += 1
+        self.sum += value_ms
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'start', 'duration_ms', 'children')
+
+    def __init__(self, tracer, name: str):
+        self.tracer = tracer
+        self.name = name
+        self.children = []
+
+    def __enter__(self):
+        self.tracer._stack().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.duration_ms = (time.perf_counter() - self.start) * 1000
+        self.tracer._finish(self)
+        return False
+
+    def to_dict(self) -> dict:
+        span = {'name': self.name, 'ms': round(self.duration_ms, 3)}
+        if self.children:
+            span['children'] = [child.to_dict() for child in self.children]
+        return span
+
+
+class Tracer:
+    def __init__(self, enabled: bool = False, jsonl_path: str = None):
+        """Tracer - nested timing spans of the question pipeline with a latency histogram per stage.
+
+        When disabled, span() returns a shared no-op context manager, so instrumented code pays one attribute check.
+
+        Args:
+            enabled (bool): Record spans.
+            jsonl_path (str, optional): Append every finished root span (one question) as a JSON line to this file.
+        """
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self.histograms = {}
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__server = None
+
+    def enable(self, jsonl_path: str = None):
+        self.jsonl_path = jsonl_path or self.jsonl_path
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name: str):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name)
+
+    def traced(self, name: str = None):
+        """ Decorator: run the function inside span(name), name defaults to the function name. """
+        def decorator(func):
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Span(self, span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _stack(self) -> list:
+        stack = getattr(self.__local, 'stack', None)
+        if stack is None:
+            stack = self.__local.stack = []
+        return stack
+
+    def _finish(self, span: _Span):
+        stack = self._stack()
+        stack.pop()
+        with self.__lock:
+            histogram = self.histograms.get(span.name)
+            if histogram is None:
+                histogram = self.histograms[span.name] = Histogram()
+            histogram.observe(span.duration_ms)
+        if stack:
+            stack[-1].children.append(span)
+        elif self.jsonl_path:
+            record = dict(span.to_dict(), ts=time.time())
+            with self.__lock, open(self.jsonl_path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(record) + '\n')
+
+    def render_prometheus(self) -> str:
+        """ Histograms in the Prometheus text exposition format. """
+        lines = ['# HELP bot_stage_latency_ms Latency of the question pipeline stages.',
+                 '# TYPE bot_stage_latency_ms histogram']
+        with self.__lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'bot_stage_latency_ms_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'bot_stage_latency_ms_sum{{stage="{stage}"}} {histogram.sum:.3f}')
+                lines.append(f'bot_stage_latency_ms_count{{stage="{stage}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def serve_prometheus(self, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """ Serve render_prometheus() on http://host:port/metrics from a daemon thread. """
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = tracer.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.__server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.__server.serve_forever, name='metrics', daemon=True).start()
+        return self.__server
+
+
+# Shared by the whole bot, enabled by Agent(trace_path=..., metrics_port=...)
+tracer = Tracer()
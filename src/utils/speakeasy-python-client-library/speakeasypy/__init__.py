@@ -1,2 +1,2 @@
-from speakeasypy.src.speakeasy import Speakeasy
+from speakeasypy.src.speakeasy import Speakeasy, RoomEvent
 from speakeasypy.src.chatroom import Chatroom
@@ -4,6 +4,8 @@ import time
 from datetime import datetime
 from typing import List, Union
 from speakeasypy.openapi.client.models import RestChatMessage, ChatMessageReaction
+from speakeasypy.src import light_models
+from speakeasypy.src.light_models import LightChatMessage, LightChatMessageReaction
 
 
 class Chatroom:
@@ -49,11 +51,19 @@ class Chatroom:
         }
 
         self.__request_limit = kwargs.get('request_limit', 1)  # seconds
+        # Decode room states into light_models instead of the generated (type checked) models.
+        self.trusted_responses = kwargs.get('trusted_responses', False)
+        self.request_timeout = kwargs.get('request_timeout', None)
+        self.outbox = kwargs.get('outbox', None)  # speakeasypy.src.outbox.Outbox, makes post_messages non-blocking
         self.__state_api_cache = None  # ChatRoomState (including messages and reactions from api call)
         self.__last_msg_timestamp = 0
         self.__last_state_call = 0
         self.__last_post_call = 0
 
+    def update_state(self):
+        """ Refresh the cached room state (rate limited). Used by Speakeasy to poll several rooms in parallel. """
+        self.__update_chat_room_state()
+
     def __update_chat_room_state(self):
         """ Cache the state of this room and implement a request rate limit for this API call. """
         if not self.session_token:
@@ -65,19 +75,29 @@ class Chatroom:
             return
 
         try:
-            response = self.chat_api.get_api_room_with_roomid_with_since(
-                room_id=self.room_id, since=self.__last_msg_timestamp, session=self.session_token)
+            if self.trusted_responses:
+                response = light_models.get_room_state(
+                    self.chat_api, room_id=self.room_id, since=self.__last_msg_timestamp, session=self.session_token,
+                    _request_timeout=self.request_timeout)
+            else:
+                response = self.chat_api.get_api_room_with_roomid_with_since(
+                    room_id=self.room_id, since=self.__last_msg_timestamp, session=self.session_token,
+                    _request_timeout=self.request_timeout)
             if response:
                 if self.__state_api_cache is None:
                     self.__state_api_cache = response
+                    for m in response.messages:
+                        self.__last_msg_timestamp = max(self.__last_msg_timestamp, m.time_stamp)
                 else:
                     # The reactions returned by the backend have nothing to do with the "since" parameter for now,
                     # so just copy all reactions here.
                     self.__state_api_cache.reactions = response.reactions
                     # Append new messages and update the last timestamp
+                    known_ordinals = {msg.ordinal for msg in self.__state_api_cache.messages}
                     for m in response.messages:
-                        if m.ordinal not in [msg.ordinal for msg in self.__state_api_cache.messages]:
+                        if m.ordinal not in known_ordinals:
                             self.__state_api_cache.messages.append(m)
+                            known_ordinals.add(m.ordinal)
                             self.__last_msg_timestamp = max(self.__last_msg_timestamp, m.time_stamp)
             else:
                 logging.error(f"Failed to update the state of room {self.room_id}.")
@@ -85,8 +105,9 @@ class Chatroom:
         except Exception as e:
             logging.error(f"An error occurred while updating the state of room {self.room_id}: {e}")
 
-    def get_messages(self, only_partner=True, only_new=True) -> List[RestChatMessage]:
-        self.__update_chat_room_state()
+    def get_messages(self, only_partner=True, only_new=True, refresh=True) -> List[RestChatMessage]:
+        if refresh:
+            self.__update_chat_room_state()
         if self.__state_api_cache is None:
             logging.error(f"Updating room state failed. No messages in room {self.room_id}.")
             return []
@@ -102,8 +123,9 @@ class Chatroom:
 
         return filtered_messages
 
-    def get_reactions(self, only_new=True) -> List[ChatMessageReaction]:
-        self.__update_chat_room_state()
+    def get_reactions(self, only_new=True, refresh=True) -> List[ChatMessageReaction]:
+        if refresh:
+            self.__update_chat_room_state()
         if self.__state_api_cache is None:
             logging.error(f"Updating room state failed. No reactions in room {self.room_id}.")
             return []
@@ -116,6 +138,10 @@ class Chatroom:
 
     def post_messages(self, message):
         if self.session_token:
+            if self.outbox is not None:
+                # Non-blocking: the outbox sends the message as soon as this room's rate limit allows it.
+                self.outbox.put(self, message)
+                return
             # Check if the time elapsed since the last post call is less than the request limit.
             current_time = time.time()
             elapsed_time = current_time - self.__last_post_call
@@ -123,22 +149,28 @@ class Chatroom:
             if elapsed_time < self.__request_limit:
                 time.sleep(self.__request_limit - elapsed_time)
                 print(f"(Sleep {self.__request_limit - elapsed_time} secs to avoid posting requests too frequently.)")
-            try:
-                response = self.chat_api.post_api_room_with_roomid(
-                    room_id=self.room_id, session=self.session_token, body=message)
-                if not response:
-                    logging.error(f"Failed to post message to room {self.room_id}.")
-            except Exception as e:
-                logging.error(f"An error occurred while posting the message to room {self.room_id}:", e)
-
-            self.__last_post_call = time.time()  # store the completed time
+            self.send_message(message)
         else:
             logging.error(f"This room {self.room_id} has no active session. Posting messages failed.")
 
-    def mark_as_processed(self, msg_or_rec: Union[RestChatMessage, ChatMessageReaction]):
-        if isinstance(msg_or_rec, RestChatMessage):
+    def send_message(self, message):
+        """ Post a message right away, without any rate limiting (used by the outbox). """
+        try:
+            response = self.chat_api.post_api_room_with_roomid(
+                room_id=self.room_id, session=self.session_token, body=message,
+                _request_timeout=self.request_timeout)
+            if not response:
+                logging.error(f"Failed to post message to room {self.room_id}.")
+        except Exception as e:
+            logging.error(f"An error occurred while posting the message to room {self.room_id}: {e}")
+
+        self.__last_post_call = time.time()  # store the completed time
+
+    def mark_as_processed(self, msg_or_rec: Union[RestChatMessage, ChatMessageReaction,
+                                                  LightChatMessage, LightChatMessageReaction]):
+        if isinstance(msg_or_rec, (RestChatMessage, LightChatMessage)):
             self.processed_ordinals['messages'].append(msg_or_rec.ordinal)
-        elif isinstance(msg_or_rec, ChatMessageReaction):
+        elif isinstance(msg_or_rec, (ChatMessageReaction, LightChatMessageReaction)):
             self.processed_ordinals['reactions'].append(msg_or_rec.message_ordinal)
         else:
             logging.error("Please pass a message or reaction object to mark it as processed.")
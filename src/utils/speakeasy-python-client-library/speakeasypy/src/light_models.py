@@ -0,0 +1,113 @@
+import json
+
+from typing import List
+
+
+class LightChatMessage:
+    """Slotted stand-in for RestChatMessage, built straight from the JSON payload (no type checking)."""
+    __slots__ = ('time_stamp', 'author_alias', 'ordinal', 'message')
+
+    def __init__(self, time_stamp: int, author_alias: str, ordinal: int, message: str):
+        self.time_stamp = time_stamp
+        self.author_alias = author_alias
+        self.ordinal = ordinal
+        self.message = message
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'LightChatMessage':
+        return cls(data['timeStamp'], data['authorAlias'], data['ordinal'], data['message'])
+
+    def __repr__(self):
+        return f"LightChatMessage(ordinal={self.ordinal}, author_alias={self.author_alias!r}, " \
+               f"time_stamp={self.time_stamp}, message={self.message!r})"
+
+
+class LightChatMessageReaction:
+    """Slotted stand-in for ChatMessageReaction."""
+    __slots__ = ('message_ordinal', 'type')
+
+    def __init__(self, message_ordinal: int, type: str):
+        self.message_ordinal = message_ordinal
+        self.type = type
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'LightChatMessageReaction':
+        return cls(data['messageOrdinal'], data['type'])
+
+    def __repr__(self):
+        return f"LightChatMessageReaction(message_ordinal={self.message_ordinal}, type={self.type!r})"
+
+
+class LightChatRoomInfo:
+    """Slotted stand-in for ChatRoomInfo (only the fields used by Speakeasy/Chatroom are kept)."""
+    __slots__ = ('uid', 'alias', 'prompt', 'start_time', 'remaining_time', 'user_aliases')
+
+    def __init__(self, uid: str, alias: str, prompt: str, start_time: int, remaining_time: int,
+                 user_aliases: List[str]):
+        self.uid = uid
+        self.alias = alias
+        self.prompt = prompt
+        self.start_time = start_time
+        self.remaining_time = remaining_time
+        self.user_aliases = user_aliases
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'LightChatRoomInfo':
+        return cls(data['uid'], data['alias'], data['prompt'], data.get('startTime'), data['remainingTime'],
+                   data['userAliases'])
+
+
+class LightChatRoomState:
+    """Slotted stand-in for ChatRoomState."""
+    __slots__ = ('info', 'messages', 'reactions')
+
+    def __init__(self, info: LightChatRoomInfo, messages: List[LightChatMessage],
+                 reactions: List[LightChatMessageReaction]):
+        self.info = info
+        self.messages = messages
+        self.reactions = reactions
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'LightChatRoomState':
+        return cls(
+            info=LightChatRoomInfo.from_json(data['info']),
+            messages=[LightChatMessage.from_json(m) for m in data['messages']],
+            reactions=[LightChatMessageReaction.from_json(r) for r in data['reactions']],
+        )
+
+
+class LightChatRoomList:
+    """Slotted stand-in for ChatRoomList."""
+    __slots__ = ('rooms',)
+
+    def __init__(self, rooms: List[LightChatRoomInfo]):
+        self.rooms = rooms
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'LightChatRoomList':
+        return cls([LightChatRoomInfo.from_json(r) for r in data['rooms']])
+
+
+def _read_json(response):
+    """ Decode a raw (not preloaded) urllib3 response and hand its connection back to the pool. """
+    try:
+        return json.loads(response.data)
+    finally:
+        response.release_conn()
+
+
+def get_room_state(chat_api, room_id: str, since: int, session: str, **kwargs) -> LightChatRoomState:
+    """Trusted-response variant of ChatApi.get_api_room_with_roomid_with_since.
+
+    The response body is not run through ApiClient.deserialize / validate_and_convert_types; the JSON is decoded
+    directly into LightChatRoomState. Use it only against a server that is known to follow the API schema.
+    """
+    response = chat_api.get_api_room_with_roomid_with_since(
+        room_id=room_id, since=since, session=session, _preload_content=False, **kwargs)
+    return LightChatRoomState.from_json(_read_json(response))
+
+
+def get_rooms(chat_api, session: str, **kwargs) -> LightChatRoomList:
+    """Trusted-response variant of ChatApi.get_api_rooms (see get_room_state)."""
+    response = chat_api.get_api_rooms(session=session, _preload_content=False, **kwargs)
+    return LightChatRoomList.from_json(_read_json(response))
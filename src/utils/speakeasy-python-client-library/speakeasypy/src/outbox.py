@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int = 1):
+        """TokenBucket - `rate` tokens are added per second, up to `capacity` (the allowed burst).
+
+        Args:
+            rate (float): Refill rate in tokens per second (1 / request_limit for the Speakeasy rate limit).
+            capacity (int): Maximum number of tokens, i.e. how many posts may be sent back to back.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.__last_refill = time.monotonic()
+
+    def __refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.__last_refill) * self.rate)
+        self.__last_refill = now
+
+    def try_consume(self, now: Optional[float] = None) -> bool:
+        self.__refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, now: Optional[float] = None) -> float:
+        """ Seconds until the next token is available. """
+        self.__refill(time.monotonic() if now is None else now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class Outbox:
+    def __init__(self,
+                 rate: float,
+                 burst: int = 1,
+                 executor=None,
+                 coalesce_threshold: int = 3,
+                 coalesce_max_length: int = 500,
+                 separator: str = '\n'):
+        """Outbox - per-room outbound message queues drained by a background scheduler.
+
+        Each room has its own token bucket, so a room that is rate limited never delays the posts of other rooms
+        and the caller (e.g. the listen loop) never sleeps. When a room's backlog reaches `coalesce_threshold`
+        messages, consecutive pending messages are joined into one post as long as the result stays within
+        `coalesce_max_length` characters.
+
+        Args:
+            rate (float): Posts per second allowed per room.
+            burst (int): Token bucket capacity per room.
+            executor: Object with an `apply_async(func, args)` method (e.g. the ApiClient thread pool) used to send
+                posts concurrently. If None, posts are sent from the scheduler thread.
+            coalesce_threshold (int): Minimum backlog size of a room before messages get merged.
+            coalesce_max_length (int): Maximum length of a merged post.
+            separator (str): Inserted between merged messages.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.executor = executor
+        self.coalesce_threshold = coalesce_threshold
+        self.coalesce_max_length = coalesce_max_length
+        self.separator = separator
+
+        self.__rooms = {}  # room_id -> Chatroom
+        self.__queues: Dict[str, Deque[str]] = {}
+        self.__buckets: Dict[str, TokenBucket] = {}
+        self.__in_flight = set()  # rooms with a post being sent (keeps the order of messages within a room)
+        self.__condition = threading.Condition()
+        self.__closed = False
+
+        self.__thread = threading.Thread(target=self.__run, name='speakeasy-outbox', daemon=True)
+        self.__thread.start()
+
+    def put(self, room, message: str):
+        """ Queue a message for `room` and return immediately. """
+        with self.__condition:
+            if self.__closed:
+                logging.error(f"Outbox is closed. Message to room {room.room_id} dropped.")
+                return
+            if room.room_id not in self.__queues:
+                self.__rooms[room.room_id] = room
+                self.__queues[room.room_id] = deque()
+                self.__buckets[room.room_id] = TokenBucket(self.rate, self.burst)
+            self.__queues[room.room_id].append(message)
+            self.__condition.notify()
+
+    def pending(self, room_id: Optional[str] = None) -> int:
+        """ Number of queued (not yet sent) messages, for one room or in total. """
+        with self.__condition:
+            if room_id is not None:
+                return len(self.__queues.get(room_id, ()))
+            return sum(len(queue) for queue in self.__queues.values())
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """ Block until every queued message has been sent. Returns False if the timeout expired first. """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.__condition:
+            while any(self.__queues.values()) or self.__in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.__condition.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = 10):
+        """ Send what is still queued (up to `timeout` seconds) and stop the scheduler. """
+        self.flush(timeout)
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__thread.join(timeout)
+
+    def __next_post(self, queue: Deque[str]) -> str:
+        message = queue.popleft()
+        if len(queue) + 1 < self.coalesce_threshold:
+            return message
+        while queue and len(message) + len(self.separator) + len(queue[0]) <= self.coalesce_max_length:
+            message += self.separator + queue.popleft()
+        return message
+
+    def __run(self):
+        with self.__condition:
+            while not self.__closed:
+                now = time.monotonic()
+                wake_up = None
+                for room_id, queue in self.__queues.items():
+                    if not queue or room_id in self.__in_flight:
+                        continue
+                    bucket = self.__buckets[room_id]
+                    if bucket.try_consume(now):
+                        self.__in_flight.add(room_id)
+                        args = (room_id, self.__next_post(queue))
+                        if self.executor is None:
+                            self.__condition.release()
+                            try:
+                                self.__send(*args)
+                            finally:
+                                self.__condition.acquire()
+                            break  # queues may have changed while unlocked
+                        self.executor.apply_async(self.__send, args)
+                    else:
+                        wait = bucket.wait_time(now)
+                        wake_up = wait if wake_up is None else min(wake_up, wait)
+                else:
+                    self.__condition.wait(wake_up)
+
+    def __send(self, room_id: str, message: str):
+        try:
+            self.__rooms[room_id].send_message(message)
+        except Exception as e:
+            logging.error(f"An error occurred while posting the message to room {room_id}: {e}")
+        finally:
+            with self.__condition:
+                self.__in_flight.discard(room_id)
+                self.__condition.notify_all()
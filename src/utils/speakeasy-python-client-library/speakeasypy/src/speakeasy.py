@@ -4,35 +4,107 @@ from speakeasypy.openapi.client.apis import ChatApi
 from speakeasypy.openapi.client.api_client import ApiClient
 from speakeasypy.openapi.client.models import LoginRequest
 from speakeasypy.src.chatroom import Chatroom
-from typing import Dict, List
+from speakeasypy.src import light_models
+from speakeasypy.src.outbox import Outbox
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+from urllib3.connection import HTTPConnection
 
 import logging
 import atexit
+import socket
 import time
 
 
+class RoomEvent(NamedTuple):
+    """ One new message or reaction from `Speakeasy.get_new_events`. kind is either 'message' or 'reaction'. """
+    room: Chatroom
+    kind: str
+    item: object
+
+
 class Speakeasy:
     def __init__(self,
                  host: str,  # production: host = https://speakeasy.ifi.uzh.ch
                  username: str,
-                 password: str):
+                 password: str,
+                 trusted_responses: bool = False,
+                 pool_size: Optional[int] = None,
+                 pool_threads: int = 1,
+                 keep_alive: bool = True,
+                 request_timeout: Optional[Union[float, Tuple[float, float]]] = None,
+                 non_blocking_posts: bool = False):
+        """
+        Args:
+            trusted_responses (bool): If True, the polling endpoints (room list and room state) skip the generated
+                model deserialization/type checking and decode the JSON into the slotted classes of light_models.
+            pool_size (int, optional): Maximum number of connections kept open to the host
+                (urllib3 maxsize). Defaults to the Configuration default (cpu_count * 5).
+            pool_threads (int): Size of the ApiClient thread pool used by `async_req=True` calls (see `thread_pool`).
+            keep_alive (bool): Enable TCP keep-alive on pooled sockets so idle connections are not dropped between polls.
+            request_timeout (float or (connect, read) tuple, optional): Timeout applied to every request.
+            non_blocking_posts (bool): If True, `Chatroom.post_messages` only queues the message; a per-room token
+                bucket scheduler (see outbox.Outbox) posts it as soon as the rate limit allows, on the thread pool.
+        """
 
         self.config = Configuration(host=host, username=username, password=password)
+        if pool_size is not None:
+            self.config.connection_pool_maxsize = pool_size
+        if keep_alive:
+            self.config.socket_options = HTTPConnection.default_socket_options + self.__keep_alive_options()
+        self.request_timeout = request_timeout
         # Create an instance of the API client
-        self.api_client = ApiClient(configuration=self.config)
+        self.api_client = ApiClient(configuration=self.config, pool_threads=pool_threads)
         # Create api for user management (login / logout for bots)
         self.user_api = UserApi(self.api_client)
         # Create api for chat management with the current session token
         self.chat_api = ChatApi(self.api_client)
 
+        self.trusted_responses = trusted_responses
         self.session_token = None
         self._chatrooms_dict: Dict[str, Chatroom] = {}  # map room_id to Chatroom (cache)
         self.__last_call_for_rooms = 0
 
         self.__request_limit = 1  # TODO: change the default value here!
 
+        self.outbox = None
+        if non_blocking_posts:
+            self.outbox = Outbox(rate=1 / self.__request_limit, executor=self.thread_pool)
+
         logging.basicConfig(level=logging.INFO)
         atexit.register(self.logout)
+        if self.outbox is not None:
+            atexit.register(self.outbox.close)  # registered last, so queued messages are sent before logout
+
+    @staticmethod
+    def __keep_alive_options() -> list:
+        options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        # Probe idle connections after 30s (only where the platform exposes these options, e.g. Linux)
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            options += [(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30),
+                        (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10),
+                        (socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)]
+        return options
+
+    @property
+    def thread_pool(self):
+        """ The ApiClient thread pool that serves `async_req=True` calls (created lazily with `pool_threads` workers). """
+        return self.api_client.pool
+
+    def get_connection_stats(self) -> Dict[str, Dict[str, int]]:
+        """ Per-host counters of the urllib3 pools: requests sent, new connections opened and requests that reused
+        an already open connection. """
+        pools = self.api_client.rest_client.pool_manager.pools
+        stats = {}
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:  # evicted in the meantime
+                continue
+            stats[f"{key.key_scheme}://{key.key_host}:{key.key_port}"] = {
+                'requests': pool.num_requests,
+                'new_connections': pool.num_connections,
+                'reused_connections': max(pool.num_requests - pool.num_connections, 0),
+            }
+        return stats
 
     def login(self) -> str:
         # Prepare the login request
@@ -61,7 +133,7 @@ class Speakeasy:
                 else:
                     logging.error("Logout failed.")
             except Exception as e:
-                logging.error("An error occurred during logout:", e)
+                logging.error("An error occurred during logout: %s", e)
         else:
             print("No active session to logout from.")
 
@@ -73,7 +145,12 @@ class Speakeasy:
             if elapsed_time >= self.__request_limit:
                 try:
                     # Call the get_api_rooms endpoint to fetch the list of chat rooms info
-                    response = self.chat_api.get_api_rooms(session=self.session_token)
+                    if self.trusted_responses:
+                        response = light_models.get_rooms(self.chat_api, session=self.session_token,
+                                                          _request_timeout=self.request_timeout)
+                    else:
+                        response = self.chat_api.get_api_rooms(session=self.session_token,
+                                                               _request_timeout=self.request_timeout)
                     if response:
                         chatroom_info_list = response.rooms
                         for room_info in chatroom_info_list:
@@ -88,7 +165,10 @@ class Speakeasy:
                                     user_aliases=room_info.user_aliases,
                                     session_token=self.session_token,
                                     chat_api=self.chat_api,
-                                    request_limit=self.__request_limit
+                                    request_limit=self.__request_limit,
+                                    trusted_responses=self.trusted_responses,
+                                    request_timeout=self.request_timeout,
+                                    outbox=self.outbox
                                 )
                             else:  # update remaining_time of existing chatrooms
                                 self._chatrooms_dict[room_info.uid].remaining_time = room_info.remaining_time
@@ -96,7 +176,7 @@ class Speakeasy:
                         logging.error("Failed to fetch chat rooms.")
                     self.__last_call_for_rooms = current_time
                 except Exception as e:
-                    logging.error("An error occurred while fetching chat rooms:", e)
+                    logging.error("An error occurred while fetching chat rooms: %s", e)
         else:
             logging.error("No active session. Please login first.")
 
@@ -111,5 +191,29 @@ class Speakeasy:
 
         return list(self._chatrooms_dict.values())
 
-
-
+    def poll_rooms(self, rooms: List[Chatroom]):
+        """ Refresh the state of all given rooms in parallel on the ApiClient thread pool (see `pool_threads`),
+        instead of one sequential round trip per room. """
+        if len(rooms) <= 1 or self.api_client.pool_threads <= 1:
+            for room in rooms:
+                room.update_state()
+            return
+        pending = [self.thread_pool.apply_async(room.update_state) for room in rooms]
+        for result in pending:
+            result.get()
+
+    def get_new_events(self, active=True, only_partner=True) -> List[RoomEvent]:
+        """ Poll all (active) rooms at once and merge their unprocessed messages and reactions into a single list.
+        Messages come first, ordered by timestamp across rooms, followed by reactions. Events still have to be
+        marked as processed on their room. """
+        rooms = self.get_rooms(active=active)
+        self.poll_rooms(rooms)
+
+        messages = []
+        reactions = []
+        for room in rooms:
+            messages += [RoomEvent(room, 'message', m)
+                         for m in room.get_messages(only_partner=only_partner, only_new=True, refresh=False)]
+            reactions += [RoomEvent(room, 'reaction', r) for r in room.get_reactions(only_new=True, refresh=False)]
+        messages.sort(key=lambda event: event.item.time_stamp)
+        return messages + reactions
@@ -0,0 +1,73 @@
+"""
+Micro-benchmark: generated OpenAPI deserialization vs. the trusted-response path (speakeasypy.src.light_models)
+for the two polling endpoints, get_api_room_with_roomid_with_since (ChatRoomState) and get_api_rooms (ChatRoomList).
+
+Runs fully offline on synthetic payloads:
+    python usecases/bench_deserialization.py --messages 50 --rooms 20 --repeat 200
+"""
+import argparse
+import json
+import time
+
+from speakeasypy.openapi.client import ApiClient, Configuration
+from speakeasypy.openapi.client.models import ChatRoomState, ChatRoomList
+from speakeasypy.src.light_models import LightChatRoomState, LightChatRoomList
+
+
+class _FakeResponse:
+    """ Mimics the RESTResponse fields used by ApiClient.deserialize. """
+    def __init__(self, data: str):
+        self.data = data
+
+    def getheader(self, name, default=None):
+        return default
+
+
+def _room_info(i: int) -> dict:
+    return {
+        'assignment': False, 'formRef': '', 'uid': f'room-{i}', 'remainingTime': 600000,
+        'userAliases': ['bot', f'user-{i}'], 'alias': 'bot', 'prompt': '', 'markAsNoFeedback': False,
+        'startTime': 1700000000000,
+    }
+
+
+def _room_state(n_messages: int) -> dict:
+    return {
+        'info': _room_info(0),
+        'messages': [{'timeStamp': 1700000000000 + i, 'authorAlias': 'user-0', 'ordinal': i,
+                      'message': f'Who directed film number {i}?'} for i in range(n_messages)],
+        'reactions': [{'messageOrdinal': i, 'type': 'THUMBS_UP'} for i in range(0, n_messages, 5)],
+    }
+
+
+def _bench(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    api_client = ApiClient(configuration=Configuration(host='http://localhost'))
+    state_payload = json.dumps(_room_state(args.messages))
+    rooms_payload = json.dumps({'rooms': [_room_info(i) for i in range(args.rooms)]})
+
+    cases = [
+        ('room state', state_payload, (ChatRoomState,), LightChatRoomState),
+        ('room list', rooms_payload, (ChatRoomList,), LightChatRoomList),
+    ]
+    for name, payload, response_type, light_cls in cases:
+        generated = _bench(lambda: api_client.deserialize(_FakeResponse(payload), response_type, True), args.repeat)
+        trusted = _bench(lambda: light_cls.from_json(json.loads(payload)), args.repeat)
+        print(f"{name:<12} generated: {generated:8.3f} ms   trusted: {trusted:8.3f} ms   "
+              f"speed-up: {generated / trusted:6.1f}x")
+
+
+if __name__ == '__main__':
+    main()